@@ -0,0 +1,202 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import pygame
+
+
+# Animation clips as (path pattern, frame count), keyed by entity type and direction
+ANIMATION_CLIPS = {
+    ('player', 'r'): ('images/player/run/player_run_r_{}.png', 6),
+    ('player', 'l'): ('images/player/run/player_run_l_{}.png', 6),
+    ('ripper', 'r'): ('images/enemy/ripper/ripper_r_{}.png', 2),
+    ('ripper', 'l'): ('images/enemy/ripper/ripper_l_{}.png', 2),
+    ('arachnid', 'r'): ('images/enemy/arachnid/arachnid_r_{}.png', 2),
+    ('arachnid', 'l'): ('images/enemy/arachnid/arachnid_l_{}.png', 2),
+    ('rhino', 'r'): ('images/enemy/rhino/rhino_r_{}.png', 3),
+    ('rhino', 'l'): ('images/enemy/rhino/rhino_l_{}.png', 3),
+    ('grenade_explosion', None): ('images/power_ups/grenade/grenade_exp_{}.png', 5),
+    ('ring_of_fire', None): ('images/power_ups/ring_of_fire/ring_of_fire_{}.png', 6),
+    ('grenade', None): ('images/power_ups/grenade/grenade_{}.png', 5),
+    ('fire', None): ('images/power_ups/ring_of_fire/fire_{}.png', 5),
+    ('shooting_speed', None): ('images/power_ups/shooting_speed/shooting_speed_{}.png', 5),
+    ('hp', None): ('images/power_ups/hp/hp_{}.png', 5),
+}
+
+
+class FrameCache:
+    def __init__(self, clips):
+        self.clips = clips
+        self.frames = {}
+        self.hits = 0
+        self.misses = 0
+
+    def decode_clip(self, key):
+        # Safe off the main thread, nothing here touches the display
+        path, frame_count = self.clips[key]
+        return tuple(pygame.image.load(path.format(i)) for i in range(1, frame_count + 1))
+
+    def load_clip(self, key):
+        return tuple(frame.convert_alpha() for frame in self.decode_clip(key))
+
+    def store(self, key, frames):
+        # A clip decoded ahead of time, still a cold load as far as the stats go
+        if key not in self.frames:
+            self.misses += 1
+        self.frames[key] = frames
+
+    def get(self, entity_type, direction=None):
+        # Every caller gets the same Surface objects, so never draw onto them
+        key = (entity_type, direction)
+        frames = self.frames.get(key)
+        if frames is None:
+            self.misses += 1
+            frames = self.load_clip(key)
+            self.frames[key] = frames
+        else:
+            self.hits += 1
+        return frames
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'clips': len(self.frames)}
+
+
+class TextCache:
+    def __init__(self, max_entries=32):
+        # Rendered text keyed by font, string, colour and antialiasing, least recently used first
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=False):
+        # Same contract as FrameCache, the returned surface is shared and must not be drawn onto
+        key = (font, text, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            self.misses += 1
+            surface = font.render(text, antialias, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_entries:
+                self.surfaces.popitem(last=False)
+        else:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.surfaces)}
+
+
+class RotationCache:
+    def __init__(self, image, step=5):
+        # Rotated copies of one image, angles are rounded to the nearest step in degrees
+        self.image = image
+        self.step = step
+        self.rotations = {}
+
+    def get(self, angle):
+        quantised = int(round(angle / self.step)) * self.step % 360
+        rotated = self.rotations.get(quantised)
+        if rotated is None:
+            rotated = pygame.transform.rotate(self.image, quantised)
+            self.rotations[quantised] = rotated
+        return rotated
+
+
+# Sounds as (path, volume), keyed by name
+SOUNDS = {
+    'desert_drums': ('sounds/desert_drums.mp3', 0),
+    'main_theme': ('sounds/main_theme.mp3', 0.5),
+    'menu_click': ('sounds/menu_click.wav', 0.5),
+    'hurt': ('sounds/hurt.wav', 0.4),
+    'dead': ('sounds/dead.wav', 0.65),
+    'shot': ('sounds/shot.mp3', 0.4),
+    'bug_shot': ('sounds/bug_shot.wav', 0.4),
+    'power_up': ('sounds/power_up.wav', 0.1),
+    'explosion': ('sounds/explosion.wav', 0.5),
+}
+
+
+class SoundBank:
+    def __init__(self, sounds):
+        self.table = sounds
+        self.sounds = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load_sound(self, name):
+        path, volume = self.table[name]
+        try:
+            sound = pygame.mixer.Sound(path)
+        except FileNotFoundError:
+            # A missing file should not keep the game from starting, play silence instead
+            print('Sound file not found: {}'.format(path), file=sys.stderr)
+            sound = pygame.mixer.Sound(buffer=bytes(4))
+        sound.set_volume(volume)
+        return sound
+
+    def get(self, name):
+        # Every caller gets the same Sound object, so its volume is shared too
+        sound = self.sounds.get(name)
+        if sound is None:
+            self.misses += 1
+            sound = self.load_sound(name)
+            self.sounds[name] = sound
+        else:
+            self.hits += 1
+        return sound
+
+    def preload(self, names=None):
+        for name in names if names is not None else self.table:
+            if name not in self.sounds:
+                self.sounds[name] = self.load_sound(name)
+                self.misses += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'sounds': len(self.sounds)}
+
+
+class AssetLoader:
+    def __init__(self, images, frame_cache, sound_bank, sounds):
+        # images maps names to paths, every clip of the frame cache and the named sounds are loaded too
+        self.images = images
+        self.frame_cache = frame_cache
+        self.sound_bank = sound_bank
+        self.sounds = sounds
+
+        self.decoded_images = {}
+        self.decoded_clips = {}
+        self.error = None
+        self.done = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.decode, name='asset-loader', daemon=True)
+        self.thread.start()
+
+    def decode(self):
+        # Runs in the worker: files are read and decoded, converting to the display format is left to finish
+        try:
+            for name, path in self.images.items():
+                self.decoded_images[name] = pygame.image.load(path)
+            for key in self.frame_cache.clips:
+                self.decoded_clips[key] = self.frame_cache.decode_clip(key)
+            self.sound_bank.preload(self.sounds)
+        except Exception as error:
+            self.error = error
+        finally:
+            self.done.set()
+
+    def ready(self):
+        return self.done.is_set()
+
+    def finish(self):
+        # Main thread only: waits for the worker if it is still busy, then converts everything it decoded
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+        for key, frames in self.decoded_clips.items():
+            self.frame_cache.store(key, tuple(frame.convert_alpha() for frame in frames))
+        return {name: image.convert_alpha() for name, image in self.decoded_images.items()}
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+import pygame
+
+
+class ChunkedBackground:
+    def __init__(self, world, tile_images, max_chunks=9):
+        # Chunk surfaces line up with the chunks of the world store
+        self.world = world
+        self.tile_images = tile_images
+        self.tile_size = world.tile_size
+        self.chunk_tiles = world.chunk_tiles
+        self.chunk_size = world.chunk_size
+        self.max_chunks = max_chunks
+
+        # Baked chunk surfaces, least recently drawn first
+        self.chunks = OrderedDict()
+        self.builds = 0
+
+    def bake_chunk(self, chunk_col, chunk_row):
+        chunk = pygame.Surface((self.chunk_size, self.chunk_size)).convert()
+        chunk.fill((0, 0, 0))
+
+        tiles = self.world.get_chunk(chunk_col, chunk_row)
+        blits = []
+        for row in range(self.chunk_tiles):
+            offset = row * self.chunk_tiles
+            y = row * self.tile_size
+            for col in range(self.chunk_tiles):
+                tile_image = self.tile_images.get(tiles[offset + col])
+                if tile_image:
+                    blits.append((tile_image, (col * self.tile_size, y)))
+        chunk.blits(blits, doreturn=False)
+        return chunk
+
+    def get_chunk(self, chunk_col, chunk_row):
+        key = (chunk_col, chunk_row)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.bake_chunk(chunk_col, chunk_row)
+            self.chunks[key] = chunk
+            self.builds += 1
+            if len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+        else:
+            self.chunks.move_to_end(key)
+        return chunk
+
+    def draw(self, surface, offset):
+        view_width, view_height = surface.get_size()
+        first_chunk_col = int(offset[0]) // self.chunk_size
+        last_chunk_col = int(offset[0] + view_width) // self.chunk_size
+        first_chunk_row = int(offset[1]) // self.chunk_size
+        last_chunk_row = int(offset[1] + view_height) // self.chunk_size
+
+        # A world with bounds has nothing to draw outside them
+        if self.world.bounds is not None:
+            cols, rows = self.world.bounds
+            first_chunk_col = max(first_chunk_col, 0)
+            last_chunk_col = min(last_chunk_col, -(-cols // self.chunk_tiles) - 1)
+            first_chunk_row = max(first_chunk_row, 0)
+            last_chunk_row = min(last_chunk_row, -(-rows // self.chunk_tiles) - 1)
+
+        blits = []
+        for chunk_row in range(first_chunk_row, last_chunk_row + 1):
+            for chunk_col in range(first_chunk_col, last_chunk_col + 1):
+                # Same truncation as sprite rects, so tiles and sprites line up to the pixel
+                x = int(chunk_col * self.chunk_size - offset[0])
+                y = int(chunk_row * self.chunk_size - offset[1])
+                blits.append((self.get_chunk(chunk_col, chunk_row), (x, y)))
+        surface.blits(blits, doreturn=False)
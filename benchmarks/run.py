@@ -0,0 +1,256 @@
+"""Frame time of the game loop in named scenarios, split into the phases of update_game and draw_game.
+
+Runs headless with SDL's dummy drivers. Results are written as JSON and can be compared
+against a stored baseline, the run fails when a timing grows past the tolerance.
+
+A game recorded with main.py --record can be added as a scenario with --replay.
+
+Run from the repository root: python benchmarks/run.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main as game
+from profiling import PhaseTimer
+from replay import InputReplay
+
+# Phases marked in update_game and draw_game
+PHASES = [phase for phase, _ in game.PROFILER_PHASES]
+
+# Timings compared against the baseline
+METRICS = ['mean_ms', 'p95_ms', 'p99_ms']
+
+# Frames between the grenades and ring of fire set off in minute_9_full, so every window has area damage
+BLAST_INTERVAL = 30
+
+
+def place_horde(count, min_distance, max_distance, weights):
+    # Enemies scattered in a ring around the player
+    center = game.player.original_pos
+    enemy_types = list(weights)
+    for _ in range(count):
+        enemy_type = game.rng.choices(enemy_types, weights=[weights[t] for t in enemy_types])[0]
+        angle = game.rng.uniform(0, 2 * math.pi)
+        distance = game.rng.uniform(min_distance, max_distance)
+        game.add_enemy(game.enemies, center.x + math.cos(angle) * distance, center.y + math.sin(angle) * distance,
+                       enemy_type)
+
+
+def clear_enemies():
+    if game.swarm is not None:
+        game.swarm.clear()
+    else:
+        game.enemies.empty()
+
+
+def set_game_time(minutes):
+    game.minutes_count = minutes
+    game.seconds_count = 0
+    game.frame_count = 1
+
+
+def setup_empty():
+    clear_enemies()
+
+
+def setup_minute_3():
+    set_game_time(3)
+    place_horde(60, 250, 700, {'ripper': 3, 'arachnid': 1})
+
+
+def setup_minute_9():
+    set_game_time(9)
+    game.player.grenades = 3
+    game.player.ring_of_fire = True
+    place_horde(150, 250, 800, {'ripper': 9, 'arachnid': 3, 'rhino': 1})
+
+
+def blast_minute_9(frame):
+    # With the timers at 1 the blasts go off in this frame's update, as they would after a throw
+    if frame % BLAST_INTERVAL == 0:
+        for grenade in range(game.player.grenades):
+            game.throw_grenade(10)
+        game.set_off_ring_of_fire(20)
+        game.grenade_timer = 1
+        game.fire_timer = 1
+
+
+def setup_horde():
+    place_horde(2000, 150, 1500, {'ripper': 9, 'arachnid': 3, 'rhino': 1})
+
+
+# name: (set up the game after a reset, called with the frame number before every frame,
+#        clear the enemies after every frame)
+SCENARIOS = {
+    'empty_map': (setup_empty, None, True),
+    'minute_3_arachnids': (setup_minute_3, None, False),
+    'minute_9_full': (setup_minute_9, blast_minute_9, False),
+    'horde_2k': (setup_horde, None, False),
+}
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    count = len(samples)
+
+    def at(fraction):
+        return round(samples[min(int(count * fraction), count - 1)] * 1000, 4)
+
+    return {'mean_ms': round(sum(samples) / count * 1000, 4), 'p95_ms': at(0.95), 'p99_ms': at(0.99)}
+
+
+def summarize(timer):
+    result = percentiles([total for total, _ in timer.history])
+    result['frames'] = len(timer.history)
+    result['enemies'] = len(game.swarm) if game.swarm is not None else len(game.enemies)
+    result['phases'] = {phase: percentiles([phases.get(phase, 0) for _, phases in timer.history])
+                        for phase in PHASES}
+    return result
+
+
+def run_scenario(name, frames, warmup, seed):
+    setup, before_frame, empty = SCENARIOS[name]
+
+    game.rng.seed(seed)
+    game.reset_game()
+    game.game_state = 'game'
+    setup()
+
+    timer = PhaseTimer()
+    game.phase_timer = timer
+    for frame in range(warmup + frames):
+        if frame == warmup:
+            timer.clear()
+        if before_frame is not None:
+            before_frame(frame)
+
+        timer.begin_frame()
+        game.update_game()
+        game.draw_game()
+        timer.end_frame()
+        game.frame_count += 1
+
+        # The scenario measures a fixed situation, so the player never dies and the game never ends
+        game.player.health = 100
+        game.game_state = 'game'
+        if empty:
+            clear_enemies()
+    game.phase_timer = game.NullTimer()
+
+    return summarize(timer)
+
+
+def run_replay(path):
+    # The whole recorded game, through the same code paths as main.py --replay
+    game.input_replay = InputReplay.load(path)
+    game.seed = game.input_replay.seed
+    game.start_game()
+
+    timer = PhaseTimer()
+    game.phase_timer = timer
+    while game.running and game.game_state == 'game':
+        timer.begin_frame()
+        game.tick()
+        if game.game_state == 'game':
+            game.draw_game()
+        timer.end_frame()
+    game.phase_timer = game.NullTimer()
+
+    game.input_replay = None
+    game.running = True
+    return summarize(timer)
+
+
+def compare(results, baseline, tolerance):
+    # Every timing that grew by more than the tolerance, as printable lines
+    regressions = []
+    for name, result in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        pairs = [(name, result, base)]
+        pairs += [('{} {}'.format(name, phase), result['phases'][phase], base['phases'][phase])
+                  for phase in PHASES if phase in base.get('phases', {})]
+        for label, current, previous in pairs:
+            for metric in METRICS:
+                # Sub-millisecond noise on near empty phases is not a regression
+                if current[metric] > previous[metric] * (1 + tolerance) and current[metric] - previous[metric] > 0.05:
+                    regressions.append('{} {}: {:.3f} -> {:.3f}'.format(label, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--frames', type=int, default=600, help='measured frames per scenario')
+    parser.add_argument('--warmup', type=int, default=60, help='frames run before measuring')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--replay', metavar='PATH', help='also run a recorded game as the replay scenario')
+    parser.add_argument('--swarm', action='store_true', help='use the NumPy swarm backend for enemies')
+    parser.add_argument('--workers', type=int, default=0, help='steer the swarm in this many worker processes')
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results.json'),
+                        help='where to write the results, benchmarks/results.json by default')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+    if args.workers < 0:
+        parser.error('--workers cannot be negative')
+    if args.workers and not args.swarm:
+        parser.error('--workers needs the --swarm backend')
+
+    # Asset paths are relative to the repository root, the files given on the command line are not
+    args.output = os.path.abspath(args.output)
+    if args.baseline:
+        args.baseline = os.path.abspath(args.baseline)
+    if args.replay:
+        args.replay = os.path.abspath(args.replay)
+    os.chdir(ROOT)
+    game.init_display(True)
+    game.load_menu_assets()
+    game.load_game_assets(args.swarm, workers=args.workers)
+
+    results = {'backend': 'swarm' if args.swarm else 'sprites', 'workers': args.workers, 'frames': args.frames,
+               'seed': args.seed, 'scenarios': {}}
+    runs = [(name, lambda name=name: run_scenario(name, args.frames, args.warmup, args.seed)) for name in args.scenarios]
+    if args.replay:
+        runs.append(('replay', lambda: run_replay(args.replay)))
+
+    for name, run in runs:
+        result = run()
+        results['scenarios'][name] = result
+        print('{:20} {:>5} enemies  mean {:7.3f} ms  p95 {:7.3f} ms  p99 {:7.3f} ms'.format(
+            name, result['enemies'], result['mean_ms'], result['p95_ms'], result['p99_ms']))
+        print('    ' + '  '.join('{} {:.3f}'.format(phase, result['phases'][phase]['mean_ms']) for phase in PHASES))
+
+    if game.swarm is not None:
+        game.swarm.close()
+    game.world.stop()
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print('Results written to {}'.format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('backend') != results['backend']:
+            print('Baseline was recorded with the {} backend'.format(baseline.get('backend')))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('Slower than {}:'.format(args.baseline))
+            for line in regressions:
+                print('    ' + line)
+            sys.exit(1)
+        print('No regressions against {}'.format(args.baseline))
+
+    game.pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
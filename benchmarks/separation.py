@@ -0,0 +1,104 @@
+"""Frame time of enemy separation against enemy count, brute force loop against the spatial hash.
+
+Run from the repository root: python benchmarks/separation.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pygame.math as pgmath
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial import SpatialHash
+
+ENEMY_SPEED = 2 / 1.6
+SEPARATION_DISTANCES = {'ripper': 14 + 2, 'arachnid': 50 + 2, 'rhino': 165 + 2}
+
+
+class Bug:
+    def __init__(self, x, y, enemy_type):
+        self.original_pos = pgmath.Vector2(x, y)
+        self.separation_distance = SEPARATION_DISTANCES[enemy_type]
+
+
+def create_horde(count, seed):
+    rng = random.Random(seed)
+    bugs = []
+    for i in range(count):
+        enemy_type = rng.choices(['ripper', 'arachnid', 'rhino'], weights=[9, 3, 1])[0]
+        bugs.append(Bug(rng.uniform(-800, 800), rng.uniform(-600, 600), enemy_type))
+    return bugs
+
+
+def seek(bug, target):
+    move_vector = target - bug.original_pos
+    if move_vector.length_squared() > 0:
+        move_vector.scale_to_length(ENEMY_SPEED)
+    return move_vector
+
+
+def step_brute_force(bugs, target):
+    # Same loop as Enemy.update before the spatial hash
+    for bug in bugs:
+        move_vector = seek(bug, target)
+        for other in bugs:
+            if other is not bug:
+                distance = other.original_pos - bug.original_pos
+                if 0 < distance.length() < bug.separation_distance:
+                    move_vector -= distance.normalize() * (ENEMY_SPEED / 2)
+        bug.original_pos += move_vector
+
+
+def step_spatial_hash(bugs, target, grid):
+    grid.clear()
+    for bug in bugs:
+        grid.insert(bug, bug.original_pos.x, bug.original_pos.y)
+
+    for bug in bugs:
+        move_vector = seek(bug, target)
+        for other in grid.query(bug.original_pos.x, bug.original_pos.y, bug.separation_distance):
+            if other is not bug:
+                distance = other.original_pos - bug.original_pos
+                if 0 < distance.length() < bug.separation_distance:
+                    move_vector -= distance.normalize() * (ENEMY_SPEED / 2)
+        old_x, old_y = bug.original_pos
+        bug.original_pos += move_vector
+        grid.move(bug, old_x, old_y, bug.original_pos.x, bug.original_pos.y)
+
+
+def time_frames(step, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        step()
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--counts', type=int, nargs='+', default=[100, 250, 500, 1000, 2000])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--brute-force-limit', type=int, default=2000,
+                        help='skip the brute force loop above this many enemies')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    target = pgmath.Vector2(0, 0)
+    print('{:>8} {:>16} {:>16} {:>8}'.format('enemies', 'brute force ms', 'spatial hash ms', 'speedup'))
+    for count in args.counts:
+        grid = SpatialHash(64)
+        hash_bugs = create_horde(count, args.seed)
+        hash_ms = time_frames(lambda: step_spatial_hash(hash_bugs, target, grid), args.frames)
+
+        if count <= args.brute_force_limit:
+            brute_bugs = create_horde(count, args.seed)
+            brute_ms = time_frames(lambda: step_brute_force(brute_bugs, target), args.frames)
+            print('{:>8} {:>16.2f} {:>16.2f} {:>7.1f}x'.format(count, brute_ms, hash_ms, brute_ms / hash_ms))
+        else:
+            print('{:>8} {:>16} {:>16.2f} {:>8}'.format(count, '-', hash_ms, '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+from array import array
+from itertools import compress
+
+
+class EntityStore:
+    def __init__(self, components, capacity=32):
+        # components maps each component name to the array typecode of its values. Every component
+        # is one dense array indexed by entity id, so an entity is only a row number
+        self.components = components
+        self.capacity = 0
+        self.count = 0
+        self.alive = bytearray()
+
+        # Ids of destroyed entities are handed out again, lowest first after a clear
+        self.free = []
+        for name, typecode in components.items():
+            setattr(self, name, array(typecode))
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        # Only ever grows, rows past the live ones stay allocated for the next entities
+        added = capacity - self.capacity
+        for name, typecode in self.components.items():
+            getattr(self, name).extend(array(typecode, [0]) * added)
+        self.alive.extend(bytes(added))
+        self.free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        # Ids of the live entities in id order. A snapshot, so entities can be destroyed while iterating
+        return iter(list(compress(range(self.capacity), self.alive)))
+
+    def create(self, **values):
+        # Components left out start at zero
+        if not self.free:
+            self.grow(self.capacity * 2)
+        entity = self.free.pop()
+        for name in self.components:
+            getattr(self, name)[entity] = values.get(name, 0)
+        self.alive[entity] = 1
+        self.count += 1
+        return entity
+
+    def destroy(self, entity):
+        # Destroying a dead entity again is a no-op, its id must not go on the free list twice
+        if not self.alive[entity]:
+            return
+        self.alive[entity] = 0
+        self.free.append(entity)
+        self.count -= 1
+
+    def clear(self):
+        self.alive = bytearray(self.capacity)
+        self.free = list(range(self.capacity - 1, -1, -1))
+        self.count = 0
@@ -0,0 +1,105 @@
+import math
+
+# Steps between neighbouring cells, orthogonal first so ties are broken towards straight moves.
+# A cell's direction is stored as 1 + the index of its step, 0 is a cell with no way to the target
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+DIRECTIONS = [None] + [(dx / math.hypot(dx, dy), dy / math.hypot(dx, dy)) for dx, dy in STEPS]
+
+
+class FlowField:
+    def __init__(self, world, radius, layers_per_update=8):
+        # Breadth-first search outward from the target cell over the square of cells within radius of it,
+        # every open cell it reaches points at its neighbour one step closer to the target
+        self.world = world
+        self.tile_size = world.tile_size
+        self.radius = radius
+        self.size = radius * 2 + 1
+        self.layers_per_update = layers_per_update
+        self.target = None
+        self.first_col = 0
+        self.first_row = 0
+        self.directions = bytes(self.size * self.size)
+        self.builds = 0
+
+        # A search in progress, the last finished field stays in use until it is done
+        self.search = None
+        self.search_target = None
+
+        # The search runs on a grid with a solid border, so it never has to check for the edges
+        stride = self.size + 2
+        self.offsets = [(dy * stride + dx, STEPS.index((-dx, -dy)) + 1, dx, dy) for dx, dy in STEPS]
+
+    def update(self, col, row):
+        # A new search starts when the target moves to another cell. It runs a few layers per update,
+        # so a rebuild is spread over several frames, only the very first field is finished right away
+        if (col, row) != self.search_target:
+            self.search = self.run_search(col, row)
+            self.search_target = (col, row)
+
+        layers = self.layers_per_update
+        while self.search is not None and (layers > 0 or self.target is None):
+            if next(self.search, None) is None:
+                self.search = None
+            layers -= 1
+
+    def clear(self):
+        # Forget the field and any search in progress, the next update builds a new field right away
+        self.target = None
+        self.search = None
+        self.search_target = None
+
+    def run_search(self, col, row):
+        size = self.size
+        stride = size + 2
+        first_col = col - self.radius
+        first_row = row - self.radius
+        solid = self.world.solid_grid(first_col - 1, first_row - 1, stride, stride)
+        for i in range(stride):
+            solid[i] = solid[(stride - 1) * stride + i] = 1
+            solid[i * stride] = solid[i * stride + stride - 1] = 1
+
+        # Solid cells count as visited, diagonal steps may not cut the corner of a solid cell
+        visited = bytearray(solid)
+        directions = bytearray(stride * stride)
+        start = (self.radius + 1) * stride + self.radius + 1
+        visited[start] = 1
+        frontier = [start]
+        offsets = self.offsets
+        while frontier:
+            next_frontier = []
+            for cell in frontier:
+                for offset, direction, dx, dy in offsets:
+                    neighbour = cell + offset
+                    if visited[neighbour]:
+                        continue
+                    if dx and dy and (solid[cell + dx] or solid[cell + dy * stride]):
+                        continue
+                    visited[neighbour] = 1
+                    directions[neighbour] = direction
+                    next_frontier.append(neighbour)
+            frontier = next_frontier
+            yield True
+
+        # Drop the border again and put the field in use
+        self.directions = b''.join(directions[(line + 1) * stride + 1:(line + 1) * stride + 1 + size]
+                                   for line in range(size))
+        self.first_col = first_col
+        self.first_row = first_row
+        self.target = (col, row)
+        self.builds += 1
+
+    def direction(self, x, y):
+        # Unit step towards the target from the cell of a world position, None outside the field,
+        # on the target cell and where the target cannot be reached
+        col = int(x // self.tile_size) - self.first_col
+        row = int(y // self.tile_size) - self.first_row
+        if 0 <= col < self.size and 0 <= row < self.size:
+            return DIRECTIONS[self.directions[row * self.size + col]]
+        return None
+
+    def snapshot(self):
+        # Everything a lookup needs, small enough to hand to another process every frame
+        return self.first_col, self.first_row, self.size, self.tile_size, self.directions
+
+    def stats(self):
+        return {'builds': self.builds, 'target': list(self.target) if self.target else None}
@@ -0,0 +1,69 @@
+import csv
+import mmap
+import struct
+
+# Tile ids of the binary level format, 0 is an empty cell
+TILE_IDS = {'G': 1, 'B': 2, 'W': 3}
+
+# File layout: header, then one uint8 tile id per cell, row by row
+LEVEL_MAGIC = b'STLV'
+LEVEL_VERSION = 1
+LEVEL_HEADER = struct.Struct('<4sHHH')
+
+
+class LevelMap:
+    def __init__(self, cols, rows, tiles):
+        # tiles is any buffer of cols * rows tile ids, rows are served as memoryview slices of it
+        self.cols = cols
+        self.rows = rows
+        self.tiles = memoryview(tiles)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.rows:
+            raise IndexError(row)
+        return self.tiles[row * self.cols:(row + 1) * self.cols]
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self[row]
+
+
+def load_level(path):
+    # The tiles stay in the mapped file, only the pages that are read get loaded
+    with open(path, 'rb') as file:
+        header = file.read(LEVEL_HEADER.size)
+        if len(header) < LEVEL_HEADER.size:
+            raise ValueError('{} is too short to be a level'.format(path))
+        magic, version, cols, rows = LEVEL_HEADER.unpack(header)
+        if magic != LEVEL_MAGIC:
+            raise ValueError('{} is not a level file'.format(path))
+        if version != LEVEL_VERSION:
+            raise ValueError('{} has level version {}, expected {}'.format(path, version, LEVEL_VERSION))
+
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < LEVEL_HEADER.size + cols * rows:
+        raise ValueError('{} is truncated'.format(path))
+    return LevelMap(cols, rows, memoryview(data)[LEVEL_HEADER.size:LEVEL_HEADER.size + cols * rows])
+
+
+def read_csv_level(path):
+    # Every line is a row of tile characters, the first one included
+    with open(path, newline='') as file:
+        rows = [row for row in csv.reader(file) if row]
+    cols = len(rows[0])
+    tiles = bytearray()
+    for row_number, row in enumerate(rows):
+        if len(row) != cols:
+            raise ValueError('Row {} of {} has {} tiles, expected {}'.format(row_number, path, len(row), cols))
+        tiles.extend(TILE_IDS[tile_char] if tile_char else 0 for tile_char in row)
+    return LevelMap(cols, len(rows), tiles)
+
+
+def write_level(path, level_map):
+    with open(path, 'wb') as file:
+        file.write(LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, level_map.cols, level_map.rows))
+        file.write(level_map.tiles)
+
@@ -1,9 +1,29 @@
-import pandas as pd
 import pygame
 import pygame.math as pgmath
 import random
 import sys
 import math
+import argparse
+import json
+import os
+import time
+
+from assets import ANIMATION_CLIPS, SOUNDS, AssetLoader, FrameCache, RotationCache, SoundBank, TextCache
+from background import ChunkedBackground
+from entities import EntityStore
+from flow import FlowField
+from level import TILE_IDS, load_level
+from profiling import NullTimer, PhaseTimer, ProfilerOverlay
+from replay import MAX_SEED, InputRecorder, InputReplay
+from spatial import SpatialHash
+from world import ChunkStore, LevelChunkSource, TerrainGenerator
+
+# The swarm backend is optional and needs numpy
+try:
+    from swarm import Swarm
+    from swarm_pool import SharedSwarm
+except ImportError:
+    Swarm = SharedSwarm = None
 
 # Define constants
 SCREEN_WIDTH = 800
@@ -14,6 +34,36 @@ SAND_IMAGE = "images/textures/sand.png"
 STONE_IMAGE = "images/textures/stone.png"
 CAVE_IMAGE = "images/textures/cave.png"
 
+LEVEL_MAP = 'level_map/level_map.bin'
+
+# Loaded before the first frame, everything else is loaded in the background while the menus are up
+MENU_SOUNDS = ['main_theme', 'menu_click']
+GAME_IMAGES = {
+    'sand': SAND_IMAGE,
+    'stone': STONE_IMAGE,
+    'cave': CAVE_IMAGE,
+    'outro_bg': 'images/outro.png',
+    'evac': 'images/evac.png',
+    'arrow': 'images/arrow_red.png',
+}
+
+# Stone and cave tiles block movement
+SOLID_TILES = {TILE_IDS['B'], TILE_IDS['W']}
+
+# The world is streamed in square chunks of tiles, the least recently used are dropped
+CHUNK_TILES = 16
+MAX_WORLD_CHUNKS = 64
+
+# Terrain past the edge of the level in an endless world, the same seed gives the same terrain
+WORLD_SEED = 1
+
+# Tries at finding a spawn point off solid ground before an enemy is not spawned at all
+SPAWN_ATTEMPTS = 8
+
+# Enemies within this many tiles of the player follow a flow field around solid tiles,
+# further out they head straight for the player
+FLOW_RADIUS = 24
+
 CAMERA_SPEED = 2
 ENEMY_SPEED = CAMERA_SPEED / 1.6
 ENEMY_DAMAGE = 5
@@ -22,9 +72,15 @@ MOUSE_THRESHOLD = 2 * TILE_SIZE
 ENEMY_SPAWN_DISTANCE = 100
 ENEMY_SPAWN_DISTANCE_MIN = 0
 ENEMY_SPAWN_DISTANCE_MAX = 10
+ENEMY_GRID_CELL_SIZE = TILE_SIZE
+
+# Anything on screen is closer to the player than this
+TARGETING_RADIUS = math.hypot(SCREEN_WIDTH, SCREEN_HEIGHT) / 2 + TILE_SIZE
 
-RIPPER_SPAWN_RATE = 20
-ARACHNID_SPAWN_RATE = RIPPER_SPAWN_RATE * 3
+# Shooting speed power-ups slow the ripper spawns down during a game, every game starts from the base rate
+BASE_RIPPER_SPAWN_RATE = 20
+RIPPER_SPAWN_RATE = BASE_RIPPER_SPAWN_RATE
+ARACHNID_SPAWN_RATE = BASE_RIPPER_SPAWN_RATE * 3
 RHINO_SPAWN_RATE = ARACHNID_SPAWN_RATE * 3
 
 SHOOTING_SPEED_SPAWN_RATE = 4200
@@ -32,32 +88,64 @@ GRENADE_SPAWN_RATE = 3600
 FIRE_SPAWN_RATE = 6900
 HP_SPAWN_RATE = 6600
 
+RING_OF_FIRE_RADIUS = 62
+
+BULLET_SPEED = 10
+BULLET_LIFETIME = 120
+BULLET_SIZE = 3
+
+# Short-lived entities are rows in entity stores, one array per component.
+# Creating and destroying them reuses rows instead of allocating sprites
+BULLET_COMPONENTS = {'x': 'd', 'y': 'd', 'dx': 'd', 'dy': 'd', 'lifetime': 'i'}
+GRENADE_COMPONENTS = {'x': 'i', 'y': 'i', 'animation': 'd', 'damage_radius': 'i', 'damage': 'i'}
+FIRE_COMPONENTS = {'x': 'i', 'y': 'i', 'animation': 'd', 'damage': 'i'}
+POWER_UP_COMPONENTS = {'x': 'i', 'y': 'i', 'animation': 'd', 'kind': 'b'}
+POWER_UP_TYPES = ('grenade', 'fire', 'shooting_speed', 'hp')
+
 FPS = 60
 
+# The simulation runs at a fixed 60 ticks per second, whatever the frame rate.
+# Below 12 FPS the game slows down rather than running ever more ticks per frame
+TICK_TIME = 1 / 60
+MAX_TICKS_PER_FRAME = 5
+
+# Menus without animation wait for events and wake up a few times a second (ms),
+# scrolling text moves one pixel every other tick
+STATIC_MENUS = ('start_menu', 'credits', 'game_over')
+SCROLLING_MENUS = ('intro', 'evac')
+MENU_IDLE_TIMEOUT = 250
+SCROLL_IDLE_TIMEOUT = int(TICK_TIME * 2 * 1000)
+
+# Debug overlay with frame times, phases as marked in update_game and draw_game
+PROFILER_KEY = pygame.K_F3
+PROFILER_PHASES = [
+    ('spawning', 'spawning'),
+    ('enemies', 'enemy update'),
+    ('player', 'player update'),
+    ('pickups', 'grenades/fire'),
+    ('bullets', 'bullets'),
+    ('aoe', 'area damage'),
+    ('tiles', 'tile culling'),
+    ('camera', 'camera apply'),
+    ('draw', 'draw'),
+]
+PROFILER_COUNTERS = ['enemies', 'bullets', 'power_ups', 'grenades', 'fires']
+
+# Headless runs steer the player with a pointer circling the screen centre
+HEADLESS_MOUSE_RADIUS = 200
+HEADLESS_MOUSE_TURN = 0.005
+
 
 class Player(pygame.sprite.Sprite):
     def __init__(self, map_width, map_height):
         super().__init__()
 
-        player_run_r_1 = pygame.image.load('images/player/run/player_run_r_1.png').convert_alpha()
-        player_run_r_2 = pygame.image.load('images/player/run/player_run_r_2.png').convert_alpha()
-        player_run_r_3 = pygame.image.load('images/player/run/player_run_r_3.png').convert_alpha()
-        player_run_r_4 = pygame.image.load('images/player/run/player_run_r_4.png').convert_alpha()
-        player_run_r_5 = pygame.image.load('images/player/run/player_run_r_5.png').convert_alpha()
-        player_run_r_6 = pygame.image.load('images/player/run/player_run_r_6.png').convert_alpha()
-        self.player_run_r = [player_run_r_1, player_run_r_2, player_run_r_3, player_run_r_4, player_run_r_5, player_run_r_6]
-
-        player_run_l_1 = pygame.image.load('images/player/run/player_run_l_1.png').convert_alpha()
-        player_run_l_2 = pygame.image.load('images/player/run/player_run_l_2.png').convert_alpha()
-        player_run_l_3 = pygame.image.load('images/player/run/player_run_l_3.png').convert_alpha()
-        player_run_l_4 = pygame.image.load('images/player/run/player_run_l_4.png').convert_alpha()
-        player_run_l_5 = pygame.image.load('images/player/run/player_run_l_5.png').convert_alpha()
-        player_run_l_6 = pygame.image.load('images/player/run/player_run_l_6.png').convert_alpha()
-        self.player_run_l = [player_run_l_1, player_run_l_2, player_run_l_3, player_run_l_4, player_run_l_5, player_run_l_6]
+        self.player_run_r = frame_cache.get('player', 'r')
+        self.player_run_l = frame_cache.get('player', 'l')
 
         self.player_index = 0
 
-        self.image = player_run_r_1
+        self.image = self.player_run_r[0]
         self.rect = self.image.get_rect()
         self.rect.center = (map_width // 2, map_height // 2)
 
@@ -67,14 +155,12 @@ class Player(pygame.sprite.Sprite):
         self.ring_of_fire = False
         self.ring_of_fire_rate = 360
         self.original_pos = pgmath.Vector2(self.rect.topleft)
+        self.previous_pos = pgmath.Vector2(self.original_pos)
 
-        self.hurt_sound = pygame.mixer.Sound('sounds/hurt.wav')
-        self.hurt_sound.set_volume(0.4)
-        self.dead_sound = pygame.mixer.Sound('sounds/dead.wav')
-        self.dead_sound.set_volume(0.65)
+        self.hurt_sound = sound_bank.get('hurt')
+        self.dead_sound = sound_bank.get('dead')
         self.dead_sound_flag = True
-        self.shooting_sound = pygame.mixer.Sound('sounds/shot.mp3')
-        self.shooting_sound.set_volume(0.4)
+        self.shooting_sound = sound_bank.get('shot')
 
     def calculate_move_vector(self, mouse_pos):
         center = pgmath.Vector2(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
@@ -100,54 +186,67 @@ class Player(pygame.sprite.Sprite):
 
         return move_vector_x, move_vector_y
 
-    def check_collision(self, move_vector_x, move_vector_y, tiles):
-        future_position_x = pgmath.Vector2(self.rect.topleft) + move_vector_x
-        future_position_y = pgmath.Vector2(self.rect.topleft) + move_vector_y
+    def check_collision(self, move_vector_x, move_vector_y, world):
+        # The tile grid is in world space, so test the future world position
+        future_position_x = self.original_pos + move_vector_x
+        future_position_y = self.original_pos + move_vector_y
         future_rect_x = self.image.get_rect(topleft=future_position_x)
         future_rect_y = self.image.get_rect(topleft=future_position_y)
 
         collision_normals = []
-        for tile in tiles:
-            if tile.image in [stone_image, cave_image]:
-                if future_rect_x.colliderect(tile.rect):
-                    normal_x = pgmath.Vector2(-move_vector_x.x, 0)
-                    if normal_x.length_squared() > 0:
-                        collision_normals.append(normal_x.normalize())
-                if future_rect_y.colliderect(tile.rect):
-                    normal_y = pgmath.Vector2(0, -move_vector_y.y)
-                    if normal_y.length_squared() > 0:
-                        collision_normals.append(normal_y.normalize())
+        if world.collides(future_rect_x):
+            normal_x = pgmath.Vector2(-move_vector_x.x, 0)
+            if normal_x.length_squared() > 0:
+                collision_normals.append(normal_x.normalize())
+        if world.collides(future_rect_y):
+            normal_y = pgmath.Vector2(0, -move_vector_y.y)
+            if normal_y.length_squared() > 0:
+                collision_normals.append(normal_y.normalize())
 
         return collision_normals
 
-    def find_closest_enemy_in_camera(self, enemies, camera):
-        visible_enemies = []
-        for enemy in enemies:
-            screen_pos = enemy.original_pos - camera.offset
-            if 0 <= screen_pos.x <= SCREEN_WIDTH and 0 <= screen_pos.y <= SCREEN_HEIGHT:
-                visible_enemies.append(enemy)
+    def find_enemies_in_camera(self, enemy_grid, camera, count=1, radius=TARGETING_RADIUS):
+        # The closest on-screen enemies, nearest first, searched outward through the enemy grid
+        left, top = camera.offset
+        right = left + SCREEN_WIDTH
+        bottom = top + SCREEN_HEIGHT
+
+        def on_screen(enemy):
+            return enemy.alive() and left <= enemy.original_pos.x <= right and top <= enemy.original_pos.y <= bottom
+
+        return enemy_grid.nearest(self.original_pos.x, self.original_pos.y, lambda enemy: enemy.original_pos,
+                                  count, radius, on_screen)
+
+    def find_closest_enemy_in_camera(self, enemy_grid, camera):
+        closest_enemies = self.find_enemies_in_camera(enemy_grid, camera)
+        return closest_enemies[0] if closest_enemies else None
 
-        if not visible_enemies:
-            return None
+    def shoot_bullet(self, bullets, camera, enemy_grid):
+        if swarm is not None:
+            target = swarm.find_closest_in_view(self.original_pos, camera.get_view_rect())
+        else:
+            closest_enemy = self.find_closest_enemy_in_camera(enemy_grid, camera)
+            target = closest_enemy.get_colliderect_center() if closest_enemy is not None else None
 
-        closest_enemy = min(visible_enemies, key=lambda enemy: (self.original_pos - enemy.original_pos).length())
-        return closest_enemy
+        if target is not None:
+            shoot_direction = pgmath.Vector2(target[0], target[1]) - pgmath.Vector2(self.rect.center)
 
-    def shoot_bullet(self, bullets, camera, enemies):
-        closest_enemy = self.find_closest_enemy_in_camera(enemies, camera)
-        if closest_enemy is not None:
-            shoot_direction = (closest_enemy.get_colliderect_center() - pgmath.Vector2(self.rect.center)).normalize()
-            bullet = Bullet(self.rect.centerx + camera.offset.x, self.rect.centery + camera.offset.y, shoot_direction)
-            bullets.add(bullet)
+            # An enemy right on top of the player gives no direction to shoot in
+            if shoot_direction.length_squared() == 0:
+                return
+            shoot_direction.normalize_ip()
+            bullets.create(x=self.rect.centerx, y=self.rect.centery, dx=shoot_direction.x, dy=shoot_direction.y,
+                           lifetime=BULLET_LIFETIME)
 
             self.shooting_sound.play()
 
-    def draw_health_bar(self, surface, camera):
+    def draw_health_bar(self, surface, camera, position):
+        # position is where the player is drawn, between ticks when the frame is interpolated
         health_bar_width = int(20 * (self.health / 100))
         health_bar_height = 5
         health_bar_color = (255, 0, 0)
 
-        health_bar_position = self.original_pos - camera.offset + pgmath.Vector2(0, self.rect.height + 2)
+        health_bar_position = position - camera.offset + pgmath.Vector2(0, self.rect.height + 2)
         health_bar_rect = pygame.Rect(health_bar_position.x, health_bar_position.y, health_bar_width, health_bar_height)
 
         pygame.draw.rect(surface, health_bar_color, health_bar_rect)
@@ -158,7 +257,7 @@ class Player(pygame.sprite.Sprite):
         if self.player_index >= len(self.player_run_r):
             self.player_index = 0
 
-        move_vector_x = self.calculate_move_vector(pygame.mouse.get_pos())[0]
+        move_vector_x = self.calculate_move_vector(get_mouse_pos())[0]
         if move_vector_x[0] < 0:
             self.image = self.player_run_l[int(self.player_index)]
         else:
@@ -168,10 +267,10 @@ class Player(pygame.sprite.Sprite):
         self.animation_state()
 
         # Update player position based on mouse position
-        mouse_pos = pygame.mouse.get_pos()
+        mouse_pos = get_mouse_pos()
         move_vector_x, move_vector_y = player.calculate_move_vector(mouse_pos)
 
-        collision_normals = player.check_collision(move_vector_x, move_vector_y, tiles)
+        collision_normals = player.check_collision(move_vector_x, move_vector_y, world)
 
         for normal in collision_normals:
             move_vector_x -= normal * move_vector_x.dot(normal)
@@ -181,6 +280,7 @@ class Player(pygame.sprite.Sprite):
 
         # Update the original position of the player
         player.original_pos += move_vector
+        player.rect.topleft = player.original_pos
 
         # Update the camera
         camera.update(move_vector)
@@ -190,33 +290,15 @@ class Enemy(pygame.sprite.Sprite):
     def __init__(self, x, y, target, enemy_type, speed, health, damage):
         super().__init__()
 
-        ripper_r_1 = pygame.image.load('images/enemy/ripper/ripper_r_1.png').convert_alpha()
-        ripper_r_2 = pygame.image.load('images/enemy/ripper/ripper_r_2.png').convert_alpha()
-        self.ripper_r = [ripper_r_1, ripper_r_2]
-        ripper_l_1 = pygame.image.load('images/enemy/ripper/ripper_l_1.png').convert_alpha()
-        ripper_l_2 = pygame.image.load('images/enemy/ripper/ripper_l_2.png').convert_alpha()
-        self.ripper_l = [ripper_l_1, ripper_l_2]
-
-        arachnid_r_1 = pygame.image.load('images/enemy/arachnid/arachnid_r_1.png').convert_alpha()
-        arachnid_r_2 = pygame.image.load('images/enemy/arachnid/arachnid_r_2.png').convert_alpha()
-        self.arachnid_r = [arachnid_r_1, arachnid_r_2]
-        arachnid_l_1 = pygame.image.load('images/enemy/arachnid/arachnid_l_1.png').convert_alpha()
-        arachnid_l_2 = pygame.image.load('images/enemy/arachnid/arachnid_l_2.png').convert_alpha()
-        self.arachnid_l = [arachnid_l_1, arachnid_l_2]
-
-        rhino_r_1 = pygame.image.load('images/enemy/rhino/rhino_r_1.png').convert_alpha()
-        rhino_r_2 = pygame.image.load('images/enemy/rhino/rhino_r_2.png').convert_alpha()
-        rhino_r_3 = pygame.image.load('images/enemy/rhino/rhino_r_3.png').convert_alpha()
-        self.rhino_r = [rhino_r_1, rhino_r_2, rhino_r_3]
-        rhino_l_1 = pygame.image.load('images/enemy/rhino/rhino_l_1.png').convert_alpha()
-        rhino_l_2 = pygame.image.load('images/enemy/rhino/rhino_l_2.png').convert_alpha()
-        rhino_l_3 = pygame.image.load('images/enemy/rhino/rhino_l_3.png').convert_alpha()
-        self.rhino_l = [rhino_l_1, rhino_l_2, rhino_l_3]
+        self.run_r = frame_cache.get(enemy_type, 'r')
+        self.run_l = frame_cache.get(enemy_type, 'l')
+        self.animation_speed = 0.05 if enemy_type == 'rhino' else 0.1
 
         self.enemy_index = 0
         self.enemy_type = enemy_type
 
-        self.image = arachnid_r_1
+        # Every enemy type keeps the rect size of the arachnid frames
+        self.image = frame_cache.get('arachnid', 'r')[0]
         self.rect = self.image.get_rect()
         self.rect.center = (x, y)
         self.colliderect = self.rect
@@ -228,8 +310,7 @@ class Enemy(pygame.sprite.Sprite):
         self.speed = speed
         self.frames_since_last_damage = 0
 
-        self.get_hit_sound = pygame.mixer.Sound('sounds/bug_shot.wav')
-        self.get_hit_sound.set_volume(0.4)
+        self.get_hit_sound = sound_bank.get('bug_shot')
 
     def take_damage(self, damage):
         self.get_hit_sound.play()
@@ -238,59 +319,48 @@ class Enemy(pygame.sprite.Sprite):
     def animation_state(self):
         move_vector = pgmath.Vector2(player.original_pos) - pgmath.Vector2(self.original_pos)
 
-        if self.enemy_type == 'ripper':
-            self.enemy_index += 0.1
-
-            if self.enemy_index >= len(self.ripper_l):
-                self.enemy_index = 0
-            if move_vector.x < 0:
-                self.image = self.ripper_l[int(self.enemy_index)]
-            else:
-                self.image = self.ripper_r[int(self.enemy_index)]
-
-        if self.enemy_type == 'arachnid':
-            self.enemy_index += 0.1
-
-            if self.enemy_index >= len(self.arachnid_l):
-                self.enemy_index = 0
-            if move_vector.x < 0:
-                self.image = self.arachnid_l[int(self.enemy_index)]
-            else:
-                self.image = self.arachnid_r[int(self.enemy_index)]
-
-        if self.enemy_type == 'rhino':
-            self.enemy_index += 0.05
+        self.enemy_index += self.animation_speed
 
-            if self.enemy_index >= len(self.rhino_l):
-                self.enemy_index = 0
-            if move_vector.x < 0:
-                self.image = self.rhino_l[int(self.enemy_index)]
-            else:
-                self.image = self.rhino_r[int(self.enemy_index)]
+        if self.enemy_index >= len(self.run_l):
+            self.enemy_index = 0
+        if move_vector.x < 0:
+            self.image = self.run_l[int(self.enemy_index)]
+        else:
+            self.image = self.run_r[int(self.enemy_index)]
 
     def get_colliderect_center(self):
         return pgmath.Vector2(self.colliderect.center)
 
-    def update(self, player, camera, enemies, tiles):
+    def update(self, player, enemy_grid, flow_field):
         self.animation_state()
 
-        # Ensure enemies won't collide with each other
-        move_vector = pgmath.Vector2(player.original_pos) - pgmath.Vector2(self.original_pos)
-        move_vector.normalize_ip()
+        # Head for the player, around solid tiles where the flow field reaches
+        direction = flow_field.direction(self.original_pos.x + self.rect.width // 2,
+                                         self.original_pos.y + self.rect.height // 2)
+        if direction is not None:
+            move_vector = pgmath.Vector2(direction)
+        else:
+            move_vector = pgmath.Vector2(player.original_pos) - pgmath.Vector2(self.original_pos)
+            move_vector.normalize_ip()
         move_vector *= self.speed
 
-        for enemy in enemies:
+        # Ensure enemies won't collide with each other
+        # Only enemies in the grid cells around this one can be close enough to push it
+        separation_distance = self.colliderect.width + 2
+        for enemy in enemy_grid.query(self.original_pos.x, self.original_pos.y, separation_distance):
             if enemy != self:
-                distance_to_enemy = pgmath.Vector2(enemy.original_pos) - pgmath.Vector2(self.original_pos)
-                if 0 < distance_to_enemy.length() < (self.colliderect.width + 2):
+                distance_to_enemy = enemy.original_pos - self.original_pos
+                if 0 < distance_to_enemy.length() < separation_distance:
                     move_vector -= distance_to_enemy.normalize() * (ENEMY_SPEED / 2)
 
         move_vector_x = pgmath.Vector2(move_vector.x, 0)
         move_vector_y = pgmath.Vector2(0, move_vector.y)
         move_vector = move_vector_x + move_vector_y
 
+        old_x, old_y = self.original_pos
         self.original_pos += move_vector
-        self.rect.topleft = self.original_pos - camera.offset
+        self.rect.topleft = self.original_pos
+        enemy_grid.move(self, old_x, old_y, self.original_pos.x, self.original_pos.y)
 
         # Create collision rectangles
         if self.enemy_type == 'ripper':
@@ -315,380 +385,312 @@ class Enemy(pygame.sprite.Sprite):
                 self.frames_since_last_damage += 1
 
 
-class Bullet(pygame.sprite.Sprite):
-    def __init__(self, x, y, direction):
-        super().__init__()
-        self.image = pygame.Surface((3, 3))
-        self.image.fill((0, 0, 0))
-        self.rect = self.image.get_rect()
-        self.rect.center = (x, y)
-        self.original_pos = pgmath.Vector2(x, y)
-        self.direction = direction
-        self.speed = 10
+class Camera:
+    def __init__(self):
+        self.offset = pgmath.Vector2(0, 0)
+        self.previous_offset = pgmath.Vector2(0, 0)
+
+    def save_offset(self):
+        # Kept at the start of every tick, so frames can be drawn between two ticks
+        self.previous_offset.update(self.offset)
+
+    def interpolate(self, alpha):
+        return self.previous_offset.lerp(self.offset, alpha)
+
+    def get_view_rect(self):
+        return pygame.Rect(int(self.offset.x), int(self.offset.y), SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    def apply(self, rect):
+        # Sprites keep their world rects, only the drawn copy is moved into screen space
+        return pygame.Rect(int(rect.x - self.offset.x), int(rect.y - self.offset.y), rect.width, rect.height)
+
+    def draw(self, surface, sprites):
+        offset_x, offset_y = self.offset
+        blits = []
+        for sprite in sprites:
+            x = int(sprite.rect.x - offset_x)
+            y = int(sprite.rect.y - offset_y)
+            width, height = sprite.image.get_size()
+            if x < SCREEN_WIDTH and y < SCREEN_HEIGHT and x + width > 0 and y + height > 0:
+                blits.append((sprite.image, (x, y)))
+        surface.blits(blits, doreturn=False)
+
+    def draw_images(self, surface, images):
+        # (image, world x, world y) of entities that are not sprites
+        offset_x, offset_y = self.offset
+        blits = []
+        for image, world_x, world_y in images:
+            x = int(world_x - offset_x)
+            y = int(world_y - offset_y)
+            width, height = image.get_size()
+            if x < SCREEN_WIDTH and y < SCREEN_HEIGHT and x + width > 0 and y + height > 0:
+                blits.append((image, (x, y)))
+        surface.blits(blits, doreturn=False)
 
-    def update(self, camera):
-        self.original_pos += self.direction * self.speed
-        self.rect.center = self.original_pos - camera.offset
+    def update(self, move_vector):
+        self.offset += move_vector
 
 
-class Grenade(pygame.sprite.Sprite):
-    def __init__(self, x, y, damage_radius, damage_amount):
-        super().__init__()
 
-        grenade_1 = pygame.image.load('images/power_ups/grenade/grenade_exp_1.png').convert_alpha()
-        grenade_2 = pygame.image.load('images/power_ups/grenade/grenade_exp_2.png').convert_alpha()
-        grenade_3 = pygame.image.load('images/power_ups/grenade/grenade_exp_3.png').convert_alpha()
-        grenade_4 = pygame.image.load('images/power_ups/grenade/grenade_exp_4.png').convert_alpha()
-        grenade_5 = pygame.image.load('images/power_ups/grenade/grenade_exp_5.png').convert_alpha()
-        self.grenade_exp = [grenade_1, grenade_2, grenade_3, grenade_4, grenade_5]
+def create_level(level_map, tile_images, endless=False):
+    # The world is streamed in chunks around the camera: collision and spawning read tile ids
+    # from the chunk store and the background bakes the same chunks into surfaces.
+    # An endless world continues past the level with generated terrain
+    generator = TerrainGenerator(WORLD_SEED) if endless else None
+    source = LevelChunkSource(level_map, CHUNK_TILES, generator)
+    bounds = None if endless else (level_map.cols, level_map.rows)
+    world = ChunkStore(source, SOLID_TILES, TILE_SIZE, CHUNK_TILES, MAX_WORLD_CHUNKS, bounds)
+    background = ChunkedBackground(world, tile_images)
+    return world, background
 
-        self.grenade_index = 0
 
-        self.image = grenade_1
-        self.rect = self.image.get_rect()
-        self.rect.center = (x, y)
-        self.original_pos = pgmath.Vector2(x, y)
-        self.damage_radius = damage_radius
-        self.damage_amount = damage_amount
-
-    def throw_grenade(sprite_group, damage_amount):
-        grenade_x = random.randint(int(camera.offset.x), int(camera.offset.x + SCREEN_WIDTH - TILE_SIZE))
-        grenade_y = random.randint(int(camera.offset.y), int(camera.offset.y + SCREEN_HEIGHT - TILE_SIZE))
-        grenade = Grenade(grenade_x, grenade_y, TILE_SIZE * 2, damage_amount)
-        sprite_group.add(grenade)
-
-        explosion_sound = pygame.mixer.Sound('sounds/explosion.wav')
-        explosion_sound.set_volume(0.5)
-        explosion_sound.play()
-
-    def explode(sprite_group, enemies):
-        for grenade in sprite_group:
-            sprite_group.remove(grenade)
-            for enemy in enemies:
-                grenade_area = pygame.Rect(grenade.rect.x, grenade.rect.y, grenade.damage_radius, grenade.damage_radius)
-                if grenade_area.colliderect(enemy.rect):
-                    enemy.take_damage(grenade.damage_amount)
-                    if enemy.health <= 0:
-                        enemies.remove(enemy)
+def spawn_enemy(camera, enemies, enemy_type):
+    for _ in range(SPAWN_ATTEMPTS):
+        # Choose a random side of the viewport (0 = left, 1 = right, 2 = top, 3 = bottom)
+        side = rng.randint(0, 3)
+        offset = 10
 
-    def animation_state(self):
-        self.grenade_index += 0.1
-        if self.grenade_index >= len(self.grenade_exp):
-            self.grenade_index = 0
-        self.image = self.grenade_exp[int(self.grenade_index)]
+        if side == 0:  # Left edge
+            x = camera.offset.x - TILE_SIZE - offset
+            y = rng.randint(int(camera.offset.y), int(camera.offset.y + SCREEN_HEIGHT - TILE_SIZE))
+        elif side == 1:  # Right edge
+            x = camera.offset.x + SCREEN_WIDTH + offset
+            y = rng.randint(int(camera.offset.y), int(camera.offset.y + SCREEN_HEIGHT - TILE_SIZE))
+        elif side == 2:  # Top edge
+            x = rng.randint(int(camera.offset.x), int(camera.offset.x + SCREEN_WIDTH - TILE_SIZE))
+            y = camera.offset.y - TILE_SIZE - offset
+        else:  # Bottom edge
+            x = rng.randint(int(camera.offset.x), int(camera.offset.x + SCREEN_WIDTH - TILE_SIZE))
+            y = camera.offset.y + SCREEN_HEIGHT + offset
 
-    def update(self):
-        self.animation_state()
+        # Bugs come out of the sand, not out of the rock
+        if world.collides(pygame.Rect(int(x), int(y), TILE_SIZE, TILE_SIZE)):
+            continue
 
+        add_enemy(enemies, x, y, enemy_type)
+        break
 
-class RingOfFire(pygame.sprite.Sprite):
-    def __init__(self, damage_amount):
-        super().__init__()
 
-        ring_of_fire_1 = pygame.image.load('images/power_ups/ring_of_fire/ring_of_fire_1.png').convert_alpha()
-        ring_of_fire_2 = pygame.image.load('images/power_ups/ring_of_fire/ring_of_fire_2.png').convert_alpha()
-        ring_of_fire_3 = pygame.image.load('images/power_ups/ring_of_fire/ring_of_fire_3.png').convert_alpha()
-        ring_of_fire_4 = pygame.image.load('images/power_ups/ring_of_fire/ring_of_fire_4.png').convert_alpha()
-        ring_of_fire_5 = pygame.image.load('images/power_ups/ring_of_fire/ring_of_fire_5.png').convert_alpha()
-        ring_of_fire_6 = pygame.image.load('images/power_ups/ring_of_fire/ring_of_fire_6.png').convert_alpha()
-        self.ring_of_fire = [ring_of_fire_1, ring_of_fire_2, ring_of_fire_3, ring_of_fire_4, ring_of_fire_5, ring_of_fire_6]
+def add_enemy(enemies, x, y, enemy_type):
+    if enemy_type == 'ripper':
+        speed, health, damage = ENEMY_SPEED, 10, ENEMY_DAMAGE
 
-        self.fire_index = 0
+    if enemy_type == 'arachnid':
+        speed, health, damage = ENEMY_SPEED / 2, 20, ENEMY_DAMAGE * 2
 
-        self.image = ring_of_fire_1
-        self.rect = self.image.get_rect()
-        self.rect.center = (400, 300)
-        self.original_pos = pgmath.Vector2(300, 400)
-        self.damage_amount = damage_amount
-
-    def set_off(sprite_group, damage_amount):
-        explosion_sound = pygame.mixer.Sound('sounds/explosion.wav')
-        explosion_sound.set_volume(0.5)
-        explosion_sound.play()
-
-        fire = RingOfFire(damage_amount)
-        sprite_group.add(fire)
-
-    def explode(sprite_group, enemies):
-        for fire in sprite_group:
-            sprite_group.remove(fire)
-            for enemy in enemies:
-                fire_area = pygame.Rect(fire.rect.x, fire.rect.y, 124, 124)
-                if fire_area.colliderect(enemy.rect):
-                    enemy.take_damage(fire.damage_amount)
-                    if enemy.health <= 0:
-                        enemies.remove(enemy)
+    if enemy_type == 'rhino':
+        speed, health, damage = (ENEMY_SPEED / 2) / 2, 40, (ENEMY_DAMAGE * 2) * 2
 
-    def animation_state(self):
-        self.fire_index += 0.1
-        if self.fire_index >= len(self.ring_of_fire):
-            self.fire_index = 0
-        self.image = self.ring_of_fire[int(self.fire_index)]
+    if swarm is not None:
+        swarm.spawn(x, y, enemy_type, speed, health, damage)
+    else:
+        enemies.add(Enemy(x, y, player, enemy_type, speed, health, damage))
 
-    def update(self):
-        self.animation_state()
 
+def spawn_power_up(camera, power_ups, power_up_type):
+    while True:
+        x = rng.randint(int(camera.offset.x + TILE_SIZE), int(camera.offset.x + SCREEN_WIDTH - TILE_SIZE))
+        y = rng.randint(int(camera.offset.y + TILE_SIZE), int(camera.offset.y + SCREEN_HEIGHT - TILE_SIZE))
 
-class PowerUp(pygame.sprite.Sprite):
-    def __init__(self, x, y, power_up_type, active):
-        super().__init__()
-        grenade_1 = pygame.image.load('images/power_ups/grenade/grenade_1.png').convert_alpha()
-        grenade_2 = pygame.image.load('images/power_ups/grenade/grenade_2.png').convert_alpha()
-        grenade_3 = pygame.image.load('images/power_ups/grenade/grenade_3.png').convert_alpha()
-        grenade_4 = pygame.image.load('images/power_ups/grenade/grenade_4.png').convert_alpha()
-        grenade_5 = pygame.image.load('images/power_ups/grenade/grenade_5.png').convert_alpha()
-        self.grenade = [grenade_1, grenade_2, grenade_3, grenade_4, grenade_5]
-
-        fire_1 = pygame.image.load('images/power_ups/ring_of_fire/fire_1.png').convert_alpha()
-        fire_2 = pygame.image.load('images/power_ups/ring_of_fire/fire_2.png').convert_alpha()
-        fire_3 = pygame.image.load('images/power_ups/ring_of_fire/fire_3.png').convert_alpha()
-        fire_4 = pygame.image.load('images/power_ups/ring_of_fire/fire_4.png').convert_alpha()
-        fire_5 = pygame.image.load('images/power_ups/ring_of_fire/fire_5.png').convert_alpha()
-        self.fire = [fire_1, fire_2, fire_3, fire_4, fire_5]
-
-        shooting_speed_1 = pygame.image.load('images/power_ups/shooting_speed/shooting_speed_1.png').convert_alpha()
-        shooting_speed_2 = pygame.image.load('images/power_ups/shooting_speed/shooting_speed_2.png').convert_alpha()
-        shooting_speed_3 = pygame.image.load('images/power_ups/shooting_speed/shooting_speed_3.png').convert_alpha()
-        shooting_speed_4 = pygame.image.load('images/power_ups/shooting_speed/shooting_speed_4.png').convert_alpha()
-        shooting_speed_5 = pygame.image.load('images/power_ups/shooting_speed/shooting_speed_5.png').convert_alpha()
-        self.shooting_speed = [shooting_speed_1, shooting_speed_2, shooting_speed_3, shooting_speed_4, shooting_speed_5]
-
-        hp_1 = pygame.image.load('images/power_ups/hp/hp_1.png').convert_alpha()
-        hp_2 = pygame.image.load('images/power_ups/hp/hp_2.png').convert_alpha()
-        hp_3 = pygame.image.load('images/power_ups/hp/hp_3.png').convert_alpha()
-        hp_4 = pygame.image.load('images/power_ups/hp/hp_4.png').convert_alpha()
-        hp_5 = pygame.image.load('images/power_ups/hp/hp_5.png').convert_alpha()
-        self.hp = [hp_1, hp_2, hp_3, hp_4, hp_5]
-
-        self.power_up_index = 0
-        self.power_up_type = power_up_type
-        self.active = active
-
-        self.image = grenade_1
-        self.rect = self.image.get_rect()
-        self.rect.topleft = (x, y)
-        self.original_pos = pgmath.Vector2(x, y)
+        power_ups.create(x=x, y=y, kind=POWER_UP_TYPES.index(power_up_type))
+        break
 
-        self.power_up_sound = pygame.mixer.Sound('sounds/power_up.wav')
-        self.power_up_sound.set_volume(0.1)
 
-    def animation_state(self):
-        self.power_up_index += 0.1
-
-        if self.power_up_type == 'grenade':
-            if self.power_up_index >= len(self.grenade):
-                self.power_up_index = 0
-            self.image = self.grenade[int(self.power_up_index)]
-
-        if self.power_up_type == 'fire':
-            if self.power_up_index >= len(self.fire):
-                self.power_up_index = 0
-            self.image = self.fire[int(self.power_up_index)]
-
-        if self.power_up_type == 'shooting_speed':
-            if self.power_up_index >= len(self.shooting_speed):
-                self.power_up_index = 0
-            self.image = self.shooting_speed[int(self.power_up_index)]
-
-        if self.power_up_type == 'hp':
-            if self.power_up_index >= len(self.hp):
-                self.power_up_index = 0
-            self.image = self.hp[int(self.power_up_index)]
-
-    def player_collision(self):
-        global RIPPER_SPAWN_RATE
-
-        for power_up in power_ups:
-            if self.rect.colliderect(player.rect):
-                # Play sound
-                self.power_up_sound.play()
-
-                if self.active and self.power_up_type == 'grenade':
-                    player.grenades += 1
-                    self.active = False
-
-                if self.active and self.power_up_type == 'fire':
-                    player.ring_of_fire = True
-                    player.ring_of_fire_rate -= 60
-                    self.active = False
-
-                if self.active and self.power_up_type == 'shooting_speed':
-                    player.shoot_rate /= 2
-                    RIPPER_SPAWN_RATE *= 1.5
-                    self.active = False
-
-                if self.active and self.power_up_type == 'hp':
-                    player.health += 50
-                    if player.health >= 100:
-                        player.health = 100
-                    self.active = False
+def animate(store, frames):
+    # Pickup animations step a tenth of a frame per tick and loop
+    for entity in store:
+        store.animation[entity] += 0.1
+        if store.animation[entity] >= len(frames):
+            store.animation[entity] = 0
 
-    def update(self):
-        self.animation_state()
-        self.player_collision()
 
-        if self.active == 0:
-            power_ups.remove(power_up)
+def throw_grenade(damage_amount):
+    grenade_x = rng.randint(int(camera.offset.x), int(camera.offset.x + SCREEN_WIDTH - TILE_SIZE))
+    grenade_y = rng.randint(int(camera.offset.y), int(camera.offset.y + SCREEN_HEIGHT - TILE_SIZE))
+    grenades.create(x=grenade_x, y=grenade_y, damage_radius=TILE_SIZE * 2, damage=damage_amount)
 
+    sound_bank.get('explosion').play()
 
-class Tile(pygame.sprite.Sprite):
-    def __init__(self, tile_type, x, y):
-        super().__init__()
-        self.image = tile_type
-        self.rect = self.image.get_rect()
-        self.rect.topleft = (x, y)
-        self.original_pos = pgmath.Vector2(x, y)
 
+def explode_grenades(blasts):
+    # The blast is the circle inside the damage_radius square at the grenade's top left
+    for grenade in grenades:
+        radius = grenades.damage_radius[grenade] / 2
+        blasts.append((grenades.x[grenade] + radius, grenades.y[grenade] + radius, radius, grenades.damage[grenade]))
+    grenades.clear()
 
-class Camera:
-    def __init__(self):
-        self.offset = pgmath.Vector2(0, 0)
 
-    def apply(self, target):
-        target.rect.topleft = target.original_pos - self.offset
-        return target  # Return the modified target object
+def follow_camera(fire):
+    # The ring stays centred on the screen, so its world position moves with the camera
+    rect = frame_cache.get('ring_of_fire')[0].get_rect()
+    rect.center = camera.offset + pgmath.Vector2(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+    fires.x[fire], fires.y[fire] = rect.topleft
 
-    def update(self, move_vector):
-        self.offset += move_vector
 
+def set_off_ring_of_fire(damage_amount):
+    sound_bank.get('explosion').play()
 
+    fire = fires.create(damage=damage_amount)
+    follow_camera(fire)
 
-def create_level(level_map, tile_images):
-    tiles = pygame.sprite.Group()
-    for row, row_str in enumerate(level_map):
-        for col, tile_char in enumerate(row_str):
-            tile_image = tile_images.get(tile_char)
-            if tile_image:
-                tile = Tile(tile_image, col * TILE_SIZE, row * TILE_SIZE)
-                tiles.add(tile)
-    return tiles
 
+def explode_ring_of_fire(blasts):
+    width, height = frame_cache.get('ring_of_fire')[0].get_size()
+    for fire in fires:
+        blasts.append((fires.x[fire] + width // 2, fires.y[fire] + height // 2, RING_OF_FIRE_RADIUS, fires.damage[fire]))
+    fires.clear()
 
-def get_visible_tiles(tiles, camera):
-    visible_tiles = []
-    for tile in tiles:
-        screen_pos = tile.original_pos - camera.offset
-        if -TILE_SIZE <= screen_pos.x <= SCREEN_WIDTH + TILE_SIZE and -TILE_SIZE <= screen_pos.y <= SCREEN_HEIGHT + TILE_SIZE:
-            visible_tiles.append(tile)
-    return visible_tiles
 
+def update_power_ups():
+    global RIPPER_SPAWN_RATE
 
-def spawn_enemy(camera, enemies, enemy_type):
-    while True:
-        # Choose a random side of the viewport (0 = left, 1 = right, 2 = top, 3 = bottom)
-        side = random.randint(0, 3)
-        offset = 10
+    # Every power-up type keeps the rect size of the grenade frames
+    power_up_rect = frame_cache.get('grenade')[0].get_rect()
+    for power_up in power_ups:
+        power_up_type = POWER_UP_TYPES[power_ups.kind[power_up]]
+        power_ups.animation[power_up] += 0.1
+        if power_ups.animation[power_up] >= len(frame_cache.get(power_up_type)):
+            power_ups.animation[power_up] = 0
 
-        if side == 0:  # Left edge
-            x = camera.offset.x - TILE_SIZE - offset
-            y = random.randint(int(camera.offset.y), int(camera.offset.y + SCREEN_HEIGHT - TILE_SIZE))
-        elif side == 1:  # Right edge
-            x = camera.offset.x + SCREEN_WIDTH + offset
-            y = random.randint(int(camera.offset.y), int(camera.offset.y + SCREEN_HEIGHT - TILE_SIZE))
-        elif side == 2:  # Top edge
-            x = random.randint(int(camera.offset.x), int(camera.offset.x + SCREEN_WIDTH - TILE_SIZE))
-            y = camera.offset.y - TILE_SIZE - offset
-        else:  # Bottom edge
-            x = random.randint(int(camera.offset.x), int(camera.offset.x + SCREEN_WIDTH - TILE_SIZE))
-            y = camera.offset.y + SCREEN_HEIGHT + offset
+        power_up_rect.topleft = (power_ups.x[power_up], power_ups.y[power_up])
+        if not power_up_rect.colliderect(player.rect):
+            continue
 
-        if enemy_type == 'ripper':
-            enemy = Enemy(x, y, player, 'ripper', ENEMY_SPEED, 10, ENEMY_DAMAGE)
+        sound_bank.get('power_up').play()
 
-        if enemy_type == 'arachnid':
-            enemy = Enemy(x, y, player, 'arachnid', ENEMY_SPEED / 2, 20, ENEMY_DAMAGE * 2)
+        if power_up_type == 'grenade':
+            player.grenades += 1
 
-        if enemy_type == 'rhino':
-            enemy = Enemy(x, y, player, 'rhino', (ENEMY_SPEED / 2) / 2, 40, (ENEMY_DAMAGE * 2) * 2)
+        if power_up_type == 'fire':
+            player.ring_of_fire = True
+            player.ring_of_fire_rate -= 60
 
-        enemies.add(enemy)
-        break
+        if power_up_type == 'shooting_speed':
+            player.shoot_rate /= 2
+            RIPPER_SPAWN_RATE *= 1.5
 
+        if power_up_type == 'hp':
+            player.health += 50
+            if player.health >= 100:
+                player.health = 100
 
-def spawn_power_up(camera, power_ups, power_up_type):
-    while True:
-        x = random.randint(int(camera.offset.x + TILE_SIZE), int(camera.offset.x + SCREEN_WIDTH - TILE_SIZE))
-        y = random.randint(int(camera.offset.y + TILE_SIZE), int(camera.offset.y + SCREEN_HEIGHT - TILE_SIZE))
+        power_ups.destroy(power_up)
 
-        if power_up_type == 'grenade':
-            power_up = PowerUp(x, y, 'grenade', True)
 
-        if power_up_type == 'fire':
-            power_up = PowerUp(x, y, 'fire', True)
+def get_bullet_images():
+    bullet_rect = pygame.Rect(0, 0, BULLET_SIZE, BULLET_SIZE)
+    images = []
+    for bullet in bullets:
+        bullet_rect.center = (bullets.x[bullet], bullets.y[bullet])
+        images.append((bullet_image, bullet_rect.x, bullet_rect.y))
+    return images
 
-        if power_up_type == 'shooting_speed':
-            power_up = PowerUp(x, y, 'shooting_speed', True)
 
-        if power_up_type == 'hp':
-            power_up = PowerUp(x, y, 'hp', True)
+def get_animated_images(store, frames):
+    return [(frames[int(store.animation[entity])], store.x[entity], store.y[entity]) for entity in store]
 
-        power_ups.add(power_up)
-        break
 
+def get_power_up_images():
+    frames = [frame_cache.get(power_up_type) for power_up_type in POWER_UP_TYPES]
+    return [(frames[power_ups.kind[power_up]][int(power_ups.animation[power_up])],
+             power_ups.x[power_up], power_ups.y[power_up]) for power_up in power_ups]
 
-def render_timer():
+
+def apply_area_damage(blasts, bounds_grid, enemies):
+    # Blasts are circles (x, y, radius, damage). Damage from every blast is summed per enemy
+    # first, then applied, and the dead are removed once at the end
+    if swarm is not None:
+        if swarm.damage_circles(blasts):
+            sound_bank.get('bug_shot').play()
+        return
+
+    damage_taken = {}
+    for x, y, radius, damage in blasts:
+        blast_rect = pygame.Rect(int(x - radius), int(y - radius), int(radius * 2) + 2, int(radius * 2) + 2)
+        radius_squared = radius * radius
+        for enemy in bounds_grid.query_rect(blast_rect):
+            if not enemy.alive():
+                continue
+            # Distance from the blast centre to the closest point of the enemy rect
+            rect = enemy.rect
+            closest_x = min(max(x, rect.left), rect.right)
+            closest_y = min(max(y, rect.top), rect.bottom)
+            if (closest_x - x) ** 2 + (closest_y - y) ** 2 <= radius_squared:
+                damage_taken[enemy] = damage_taken.get(enemy, 0) + damage
+
+    for enemy, damage in damage_taken.items():
+        enemy.take_damage(damage)
+        if enemy.health <= 0:
+            enemies.remove(enemy)
+
+
+def update_timer():
     global timeout, evac_time
 
     minutes = 9 - minutes_count
     seconds = 59 - seconds_count
 
+    if minutes == 0 and seconds == 0:
+        timeout = True
+
+    if minutes < 2:
+        evac_time = True
+
+
+def render_timer():
+    minutes = 9 - minutes_count
+    seconds = 59 - seconds_count
+
     if minutes == 0 and seconds == 0:
         minutes = 0
         seconds = 0
-        timeout = True
 
     if seconds == -1:
         seconds = 59
 
     time_str = '{:02d}:{:02d}'.format(minutes, seconds)
     if minutes < 2:
-        evac_time = True
-        timer_text = font.render(time_str, False, (255, 0, 0))
+        timer_text = text_cache.render(font, time_str, (255, 0, 0))
         timer_text_rect = timer_text.get_rect(midtop=(SCREEN_WIDTH // 2, 40))
 
         if seconds % 2 == 0 and seconds > 50:
             screen.blit(return_to_evac, return_to_evac_rect)
     else:
-        timer_text = font.render(time_str, False, (0, 0, 0))
+        timer_text = text_cache.render(font, time_str, (0, 0, 0))
         timer_text_rect = timer_text.get_rect(midtop=(SCREEN_WIDTH // 2, 40))
     screen.blit(timer_text, timer_text_rect)
 
 
 def render_power_up_ui():
     # Create UI for power-ups.
-    shooting_speed_text = font.render('Shooting Speed: {}RPM'.format(int(60 / player.shoot_rate * 60)), False, (0, 0, 0))
+    shooting_speed_text = text_cache.render(font, 'Shooting Speed: {}RPM'.format(int(60 / player.shoot_rate * 60)), (0, 0, 0))
     shooting_speed_text_rect = shooting_speed_text.get_rect(topleft=(30, 530))
     screen.blit(shooting_speed_text, shooting_speed_text_rect)
 
     if player.grenades > 0:
-        grenades_text = font.render('Grenades: {} per 5s'.format(player.grenades), False, (0, 0, 0))
+        grenades_text = text_cache.render(font, 'Grenades: {} per 5s'.format(player.grenades), (0, 0, 0))
         grenades_text_rect = grenades_text.get_rect(topleft=(30, 550))
         screen.blit(grenades_text, grenades_text_rect)
 
     if player.ring_of_fire:
-        fire_text = font.render('Ring of Fire: {}s'.format(int(player.ring_of_fire_rate / 60)), False, (0, 0, 0))
+        fire_text = text_cache.render(font, 'Ring of Fire: {}s'.format(int(player.ring_of_fire_rate / 60)), (0, 0, 0))
         fire_text_rect = fire_text.get_rect(topleft=(30, 570))
         screen.blit(fire_text, fire_text_rect)
 
 
+def get_evac_zone(tile_size):
+    return pygame.Rect(86 * tile_size, 80 * tile_size, 30 * tile_size, 29 * tile_size)
+
+
 def draw_overlay(surface, camera, map_width_tiles, map_height_tiles, tile_size):
-    center_x = (86 * tile_size)
-    center_y = (80 * tile_size)
-    overlay_width = 30 * tile_size
-    overlay_height = 29 * tile_size
-    overlay_rect = pygame.Rect(center_x, center_y, overlay_width, overlay_height)
-
-    # Create a temporary object with the required attributes for the Camera's apply method
-    object = lambda: None
-    object.rect = overlay_rect
-    object.original_pos = pgmath.Vector2(overlay_rect.topleft)
-
-    camera_rect = camera.apply(object).rect
+    overlay_rect = get_evac_zone(tile_size)
+    center_x, center_y = overlay_rect.topleft
+
+    camera_rect = camera.apply(overlay_rect)
     if camera_rect.colliderect(surface.get_rect()):
-        # Draw semi-transparent red overlay
-        overlay_surface = pygame.Surface((overlay_width, overlay_height), pygame.SRCALPHA)
-        overlay_surface.fill((0, 255, 0, 80))
-        surface.blit(overlay_surface, camera_rect.topleft)
+        # Draw semi-transparent green overlay over the visible part of the zone only
+        visible_rect = camera_rect.clip(surface.get_rect())
+        surface.blit(evac_zone_surface, visible_rect.topleft, (0, 0, visible_rect.width, visible_rect.height))
     else:
         # # Draw red arrow pointing to the overlay's center
         screen_center_x, screen_center_y = surface.get_rect().center
@@ -700,8 +702,7 @@ def draw_overlay(surface, camera, map_width_tiles, map_height_tiles, tile_size):
 
 
 def draw_arrow(surface, angle, x_offset, y_offset):
-    arrow_image = pygame.image.load('images/arrow_red.png').convert_alpha()
-    arrow_rotated = pygame.transform.rotate(arrow_image, -angle)
+    arrow_rotated = arrow_cache.get(-angle)
     arrow_rect = arrow_rotated.get_rect()
 
     # Place the arrow in the top right corner of the screen
@@ -710,8 +711,27 @@ def draw_arrow(surface, angle, x_offset, y_offset):
     surface.blit(arrow_rotated, arrow_rect)
 
 
+def read_mouse_pos():
+    # A replay feeds back the recorded position of every tick
+    if input_replay is not None:
+        return input_replay.get(frame_count)
+
+    # Headless runs have no mouse, the pointer circles the player at a fixed pace instead
+    if headless:
+        angle = frame_count * HEADLESS_MOUSE_TURN
+        return (int(SCREEN_WIDTH // 2 + math.cos(angle) * HEADLESS_MOUSE_RADIUS),
+                int(SCREEN_HEIGHT // 2 + math.sin(angle) * HEADLESS_MOUSE_RADIUS))
+    return pygame.mouse.get_pos()
+
+
+def get_mouse_pos():
+    # The mouse is read once per tick, so every use within a tick sees the same position
+    return mouse_pos
+
+
 def reset_game():
-    global player, players, camera, enemies, bullets, grenades, fires, power_ups, frame_count, seconds_count, minutes_count, timeout, evac_time
+    global player, players, camera, enemies, frame_count, seconds_count, minutes_count, timeout, evac_time
+    global grenade_timer, fire_timer, RIPPER_SPAWN_RATE
 
     # Reset player
     player = Player(map_width, map_height)
@@ -721,13 +741,19 @@ def reset_game():
     # Reset camera
     camera = Camera()
     camera.offset = pgmath.Vector2(player.rect.centerx - SCREEN_WIDTH // 2, player.rect.centery - SCREEN_HEIGHT // 2)
+    camera.save_offset()
 
-    # Reset enemy, bullet, and grenade groups
+    # Reset enemies, the entity stores keep their rows for the next game
     enemies = pygame.sprite.Group()
-    bullets = pygame.sprite.Group()
-    grenades = pygame.sprite.Group()
-    fires = pygame.sprite.Group()
-    power_ups = pygame.sprite.Group()
+    if swarm is not None:
+        swarm.clear()
+    bullets.clear()
+    grenades.clear()
+    fires.clear()
+    power_ups.clear()
+
+    # Reset the flow field, so the first one is built right away as in a new process
+    flow_field.clear()
 
     # Reset counters and timers
     frame_count = 0
@@ -735,225 +761,328 @@ def reset_game():
     minutes_count = 0
     timeout = False
     evac_time = False
+    grenade_timer = 0
+    fire_timer = 0
+    RIPPER_SPAWN_RATE = BASE_RIPPER_SPAWN_RATE
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Starship Troopers: Lost Squadron')
+    parser.add_argument('--swarm', action='store_true', help='keep enemies in NumPy arrays instead of sprites')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='steer swarm enemies in this many worker processes, 0 steers them in the game loop')
+    parser.add_argument('--endless', action='store_true', help='generate terrain past the edge of the level')
+    parser.add_argument('--max-fps', type=int, default=FPS, help='frame rate cap, 0 for none')
+    parser.add_argument('--interpolate', action='store_true',
+                        help='draw the camera and player between simulation ticks')
+    parser.add_argument('--headless', action='store_true',
+                        help='run the game state without a display or audio device and report timings')
+    parser.add_argument('--frames', type=int, default=3600, help='frames to simulate in headless mode')
+    parser.add_argument('--seed', type=int, help='random seed for every game, headless runs default to 0')
+    parser.add_argument('--record', metavar='PATH', help='record the seed and input of each game to a file, '
+                             'the games after the first go to PATH with -2, -3 and so on before the extension')
+    parser.add_argument('--replay', metavar='PATH', help='play a recorded game back instead of reading the mouse')
+    args = parser.parse_args(argv)
+    if args.workers < 0:
+        parser.error('--workers cannot be negative')
+    if args.seed is not None and not 0 <= args.seed <= MAX_SEED:
+        parser.error('--seed must be from 0 to {}'.format(MAX_SEED))
+    if args.workers and not args.swarm:
+        parser.error('--workers needs the --swarm backend')
+    return args
+
+
+def init_display(headless_mode=False):
+    global screen, headless
+
+    headless = headless_mode
+    if headless:
+        # SDL's dummy drivers need no display or audio device
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
 
+    # Initialize pygame
+    pygame.init()
 
-# Initialize pygame
-pygame.init()
+    # Set up the display
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Starship Trooper")
 
-# Set up the display
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Starship Trooper")
 
-# Set up the font
-font = pygame.font.Font('font/Goldman.ttf', 21)
-ui_font = pygame.font.Font('font/Goldman.ttf', 15)
-you_died_font = pygame.font.Font('font/Goldman.ttf', 100)
+def load_menu_assets():
+    global font, ui_font, you_died_font, text_cache
+    global start_menu_bg, start_menu_bg_rect, start_button, start_button_rect
+    global credits_button, credits_button_rect, exit_button, exit_button_rect
+    global credits_text_bw, credits_text_bw_rect, credits_text_jp, credits_text_jp_rect
+    global hackathon_text, hackathon_text_rect, return_text, return_text_rect
+    global intro_bg, intro_bg_rect, story, story_rect, intro_text, intro_text_rect
+    global game_over_text, game_over_text_rect, play_again_text, play_again_text_rect, runaway_text, runaway_text_rect
+    global outro_text, outro_text_rect
+    global return_to_evac, return_to_evac_rect
+    global sound_bank, bg_music, main_menu_music, menu_click, clock
 
+    # Set up the font
+    font = pygame.font.Font('font/Goldman.ttf', 21)
+    ui_font = pygame.font.Font('font/Goldman.ttf', 15)
+    you_died_font = pygame.font.Font('font/Goldman.ttf', 100)
 
-# Load start menu images
-start_menu_bg = pygame.image.load('images/main_screen.png').convert_alpha()
-start_menu_bg_rect = start_menu_bg.get_rect(topleft=(0, 0))
+    # HUD text only changes once a second or on a power-up, so it is rendered once and reused
+    text_cache = TextCache()
 
-start_button = pygame.image.load('images/start.png').convert_alpha()
-start_button_rect = start_button.get_rect(midtop=(SCREEN_WIDTH // 2, 420))
+    # Load start menu images
+    start_menu_bg = pygame.image.load('images/main_screen.png').convert_alpha()
+    start_menu_bg_rect = start_menu_bg.get_rect(topleft=(0, 0))
 
-credits_button = pygame.image.load('images/credits.png').convert_alpha()
-credits_button_rect = credits_button.get_rect(midtop=(SCREEN_WIDTH // 2, 500))
+    start_button = pygame.image.load('images/start.png').convert_alpha()
+    start_button_rect = start_button.get_rect(midtop=(SCREEN_WIDTH // 2, 420))
 
-exit_button = pygame.image.load('images/exit.png').convert_alpha()
-exit_button_rect = exit_button.get_rect(midtop=(SCREEN_WIDTH // 2, 550))
+    credits_button = pygame.image.load('images/credits.png').convert_alpha()
+    credits_button_rect = credits_button.get_rect(midtop=(SCREEN_WIDTH // 2, 500))
 
-# Load credits images
-credits_text_bw = font.render('ART: Bartosz Wyszkowski', False, (255, 255, 255))
-credits_text_bw_rect = credits_text_bw.get_rect(midbottom=(SCREEN_WIDTH // 2, 300))
+    exit_button = pygame.image.load('images/exit.png').convert_alpha()
+    exit_button_rect = exit_button.get_rect(midtop=(SCREEN_WIDTH // 2, 550))
 
-credits_text_jp = font.render('CODE: Jan Powaga', False, (255, 255, 255))
-credits_text_jp_rect = credits_text_bw.get_rect(midbottom=(SCREEN_WIDTH // 2, 350))
+    # Load credits images
+    credits_text_bw = font.render('ART: Bartosz Wyszkowski', False, (255, 255, 255))
+    credits_text_bw_rect = credits_text_bw.get_rect(midbottom=(SCREEN_WIDTH // 2, 300))
 
-hackathon_text = font.render('Created as an entry for Pygames Hackathon 2023', False, (255, 255, 255))
-hackathon_text_rect = hackathon_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 500))
+    credits_text_jp = font.render('CODE: Jan Powaga', False, (255, 255, 255))
+    credits_text_jp_rect = credits_text_bw.get_rect(midbottom=(SCREEN_WIDTH // 2, 350))
 
-return_text = font.render('PRESS ESC TO RETURN TO MAIN MENU', False, (255, 255, 255))
-return_text_rect = return_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 550))
+    hackathon_text = font.render('Created as an entry for Pygames Hackathon 2023', False, (255, 255, 255))
+    hackathon_text_rect = hackathon_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 500))
 
-# Load intro images
-intro_bg = pygame.image.load('images/intro.png').convert_alpha()
-intro_bg_rect = intro_bg.get_rect(topleft=(0, 0))
+    return_text = font.render('PRESS ESC TO RETURN TO MAIN MENU', False, (255, 255, 255))
+    return_text_rect = return_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 550))
 
-story = pygame.image.load('images/story.png').convert_alpha()
-story_rect = story.get_rect(midtop=(SCREEN_WIDTH // 2, 600))
+    # Load intro images
+    intro_bg = pygame.image.load('images/intro.png').convert_alpha()
+    intro_bg_rect = intro_bg.get_rect(topleft=(0, 0))
 
-intro_text = font.render('PRESS ANY KEY TO START', False, (255, 255, 255))
-intro_text_rect = intro_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 550))
+    story = pygame.image.load('images/story.png').convert_alpha()
+    story_rect = story.get_rect(midtop=(SCREEN_WIDTH // 2, 600))
 
-# Load game over images
-game_over_text = you_died_font.render('YOU DIED', False, '#4F0001')
-game_over_text_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+    intro_text = font.render('PRESS ANY KEY TO START', False, (255, 255, 255))
+    intro_text_rect = intro_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 550))
 
-play_again_text = font.render('PRESS SPACE TO TRY AGAIN', False, (255, 255, 255))
-play_again_text_rect = play_again_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 500))
+    # Load game over images
+    game_over_text = you_died_font.render('YOU DIED', False, '#4F0001')
+    game_over_text_rect = game_over_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
+
+    play_again_text = font.render('PRESS SPACE TO TRY AGAIN', False, (255, 255, 255))
+    play_again_text_rect = play_again_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 500))
 
-runaway_text = font.render('PRESS ESC TO RUN AWAY LIKE A COWARD', False, (255, 255, 255))
-runaway_text_rect = runaway_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 550))
+    runaway_text = font.render('PRESS ESC TO RUN AWAY LIKE A COWARD', False, (255, 255, 255))
+    runaway_text_rect = runaway_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 550))
 
-# Load outro images
-outro_bg = pygame.image.load('images/outro.png').convert_alpha()
-outro_bg_rect = outro_bg.get_rect(topleft=(0, 0))
+    # Outro images are loaded with the game assets
+    outro_text = font.render('YOU CAN REST NOW, SOLDIER. PRESS ANY KEY.', False, (255, 255, 255))
+    outro_text_rect = outro_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 550))
 
-evac = pygame.image.load('images/evac.png').convert_alpha()
-evac_rect = evac.get_rect(midtop=(SCREEN_WIDTH // 2, 600))
+    # Other assets
 
-outro_text = font.render('YOU CAN REST NOW, SOLDIER. PRESS ANY KEY.', False, (255, 255, 255))
-outro_text_rect = outro_text.get_rect(midbottom=(SCREEN_WIDTH // 2, 550))
+    return_to_evac = font.render('RETURN TO EVAC ZONE', False, (255, 0, 0))
+    return_to_evac_rect = return_to_evac.get_rect(midtop=(SCREEN_WIDTH // 2, 75))
 
-# Other assets
+    # Load the menu sounds, every sound is decoded once and shared
+    sound_bank = SoundBank(SOUNDS)
+    sound_bank.preload(MENU_SOUNDS)
 
-return_to_evac = font.render('RETURN TO EVAC ZONE', False, (255, 0, 0))
-return_to_evac_rect = return_to_evac.get_rect(midtop=(SCREEN_WIDTH // 2, 75))
+    # The game music is loaded with the game assets
+    bg_music = None
 
-# Load audio assets
-bg_music = pygame.mixer.Sound('sounds/desert_drums.mp3')
-bg_music.set_volume(0)
-bg_music.play(loops=-1)
+    main_menu_music = sound_bank.get('main_theme')
+    main_menu_music.play(loops=-1)
 
-main_menu_music = pygame.mixer.Sound('sounds/main_theme.mp3')
-main_menu_music.set_volume(0.5)
-main_menu_music.play(loops=-1)
+    menu_click = sound_bank.get('menu_click')
 
-menu_click = pygame.mixer.Sound('sounds/menu_click.wav')
-menu_click.set_volume(0.5)
+    # Set up the clock
+    clock = pygame.time.Clock()
 
-# Set up the clock
-clock = pygame.time.Clock()
 
-# Load tile images
-sand_image = pygame.image.load(SAND_IMAGE).convert_alpha()
-stone_image = pygame.image.load(STONE_IMAGE).convert_alpha()
-cave_image = pygame.image.load(CAVE_IMAGE).convert_alpha()
+def start_loading_game_assets(use_swarm=False, endless=False, workers=0):
+    global frame_cache, swarm, asset_loader, endless_world
 
-# Create a dictionary to map characters to images
-tile_images = {
-    'G': sand_image,
-    'B': stone_image,
-    'W': cave_image,
-}
+    endless_world = endless
 
-# Define your level_map
-level_map = pd.read_csv('level_map/level_map.csv').values.tolist()
+    # Animation frames are loaded once and shared by every sprite
+    frame_cache = FrameCache(ANIMATION_CLIPS)
 
-# Calculate map dimensions
-map_width = len(level_map[0]) * TILE_SIZE
-map_height = len(level_map) * TILE_SIZE
+    # Optional NumPy swarm backend for enemies
+    swarm = None
+    if use_swarm:
+        if Swarm is None:
+            sys.exit('The --swarm backend needs numpy')
+        if workers:
+            # Enemies are steered in worker processes, strip by strip of the world
+            swarm = SharedSwarm(frame_cache, ENEMY_SPEED / 2, workers)
+        else:
+            swarm = Swarm(frame_cache, ENEMY_SPEED / 2)
 
-# Create the level and add it to a sprite group
-tiles = create_level(level_map, tile_images)
+    # Images, animation frames and the game sounds are decoded in a worker thread
+    game_sounds = [name for name in SOUNDS if name not in MENU_SOUNDS]
+    asset_loader = AssetLoader(GAME_IMAGES, frame_cache, sound_bank, game_sounds)
+    asset_loader.start()
 
-# Create player instance and add it to a sprite group
-player = Player(map_width, map_height)
-players = pygame.sprite.Group()
-players.add(player)
 
-# Create a camera instance
-camera = Camera()
+def finish_loading_game_assets():
+    global game_assets_ready, tile_images, level_map, map_width, map_height, world_rect
+    global world, background, flow_field, enemy_grid, bounds_grid, bullet_image, bg_music
+    global outro_bg, outro_bg_rect, evac, evac_rect, evac_zone_surface, arrow_cache
 
-# Center the camera on the player
-camera.offset = pgmath.Vector2(player.rect.centerx - SCREEN_WIDTH // 2, player.rect.centery - SCREEN_HEIGHT // 2)
+    # Waits for the worker if it is not done yet, then converts the images on this thread
+    images = asset_loader.finish()
 
-# Create enemies group
-enemies = pygame.sprite.Group()
+    # Create a dictionary to map tile ids to images
+    tile_images = {
+        TILE_IDS['G']: images['sand'],
+        TILE_IDS['B']: images['stone'],
+        TILE_IDS['W']: images['cave'],
+    }
 
-# Create bullets group
-bullets = pygame.sprite.Group()
+    # Outro images
+    outro_bg = images['outro_bg']
+    outro_bg_rect = outro_bg.get_rect(topleft=(0, 0))
 
-# Create grenades group
-grenades = pygame.sprite.Group()
+    evac = images['evac']
+    evac_rect = evac.get_rect(midtop=(SCREEN_WIDTH // 2, 600))
 
-# Create fires group
-fires = pygame.sprite.Group()
+    # Evacuation zone visuals: the zone is never drawn larger than the screen, so one screen-sized
+    # translucent surface covers any visible part of it, and the arrow is rotated once per 5 degrees
+    evac_zone_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+    evac_zone_surface.fill((0, 255, 0, 80))
+    arrow_cache = RotationCache(images['arrow'])
 
-# Create power_ups group
-power_ups = pygame.sprite.Group()
+    # Load the level, converted from level_map/level_map.csv by tools/convert_level.py
+    level_map = load_level(LEVEL_MAP)
 
-# Main game loop
-running = True
-game_state = 'start_menu'
+    # Calculate map dimensions
+    map_width = level_map.cols * TILE_SIZE
+    map_height = level_map.rows * TILE_SIZE
+    # Bullets leave a bounded world at its edge, an endless world has none
+    world_rect = None if endless_world else pygame.Rect(0, 0, map_width, map_height)
 
-frame_count = 0
-seconds_count = -1
-minutes_count = 0
-timeout = False
-evac_time = False
-grenade_timer = 0
-fire_timer = 0
+    # Create the level, the chunk worker of a world it replaces is stopped first
+    if world is not None:
+        world.stop()
+    world, background = create_level(level_map, tile_images, endless_world)
 
-while running:
-    # Event handling
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-            sys.exit()
+    # Directions around solid tiles towards the player's tile, shared by every enemy
+    flow_field = FlowField(world, FLOW_RADIUS)
 
-        if game_state == 'start_menu' and event.type == pygame.MOUSEBUTTONDOWN:
-            # Play sound
-            menu_click.play()
+    # Spatial hashes of enemy positions and bounds, rebuilt every frame
+    enemy_grid = SpatialHash(ENEMY_GRID_CELL_SIZE)
+    bounds_grid = SpatialHash(ENEMY_GRID_CELL_SIZE)
 
-            if start_button_rect.collidepoint(event.pos):
-                game_state = 'intro'
+    # Every bullet looks the same, so they all share one surface
+    bullet_image = pygame.Surface((BULLET_SIZE, BULLET_SIZE))
+    bullet_image.fill((0, 0, 0))
 
-            if credits_button_rect.collidepoint(event.pos):
-                game_state = 'credits'
+    # Game music plays muted until the game starts
+    bg_music = sound_bank.get('desert_drums')
+    bg_music.play(loops=-1)
 
-            if exit_button_rect.collidepoint(event.pos):
-                running = False
-                sys.exit()
+    game_assets_ready = True
+
+
+def load_game_assets(use_swarm=False, endless=False, workers=0):
+    start_loading_game_assets(use_swarm, endless, workers)
+    finish_loading_game_assets()
+
+
+def set_music(menu_volume, game_volume):
+    # The game music does not exist until the game assets are in
+    main_menu_music.set_volume(menu_volume)
+    if bg_music is not None:
+        bg_music.set_volume(game_volume)
+
+
+def handle_event(event):
+    global running, game_state
+
+    # The profiler key works in every state and is not "any key"
+    if event.type == pygame.KEYDOWN and event.key == PROFILER_KEY:
+        toggle_profiler()
+        return
+
+    if event.type == pygame.QUIT:
+        running = False
+        sys.exit()
+
+    if game_state == 'start_menu' and event.type == pygame.MOUSEBUTTONDOWN:
+        # Play sound
+        menu_click.play()
 
-        if game_state == 'credits' and event.type == pygame.KEYDOWN:
-            # Play sound
-            menu_click.play()
+        if start_button_rect.collidepoint(event.pos):
+            game_state = 'intro'
 
-            if event.key == pygame.K_ESCAPE:
-                game_state = 'start_menu'
+        if credits_button_rect.collidepoint(event.pos):
+            game_state = 'credits'
 
-        if game_state == 'intro' and event.type == pygame.KEYDOWN:
-            # Play sound
-            menu_click.play()
-            main_menu_music.set_volume(0)
-            bg_music.set_volume(0.5)
+        if exit_button_rect.collidepoint(event.pos):
+            running = False
+            sys.exit()
 
-            game_state = 'game'
-            frame_count = 0
+    if game_state == 'credits' and event.type == pygame.KEYDOWN:
+        # Play sound
+        menu_click.play()
 
-        if game_state == 'game_over' and event.type == pygame.KEYDOWN:
-            # Play sound
-            menu_click.play()
+        if event.key == pygame.K_ESCAPE:
+            game_state = 'start_menu'
 
-            if event.key == pygame.K_SPACE:
-                # Return to default values
-                reset_game()
-                game_state = 'game'
+    if game_state == 'intro' and event.type == pygame.KEYDOWN:
+        # Play sound
+        menu_click.play()
 
-                main_menu_music.set_volume(0)
-                bg_music.set_volume(0.5)
+        # Waits here for the game assets if the worker is not done yet
+        start_game()
+        set_music(0, 0.5)
 
-            if event.key == pygame.K_ESCAPE:
-                # Return to default values
-                reset_game()
-                game_state = 'start_menu'
+    if game_state == 'game_over' and event.type == pygame.KEYDOWN:
+        # Play sound
+        menu_click.play()
 
-        if game_state == 'evac' and event.type == pygame.KEYDOWN:
-            # Play sound
-            menu_click.play()
+        if event.key == pygame.K_SPACE:
+            # Return to default values
+            start_game()
+            set_music(0, 0.5)
 
+        if event.key == pygame.K_ESCAPE:
             # Return to default values
             reset_game()
             game_state = 'start_menu'
 
-    # Fix FPS at 60
-    clock.tick(FPS)
+    if game_state == 'evac' and event.type == pygame.KEYDOWN:
+        # Play sound
+        menu_click.play()
+
+        # Return to default values
+        reset_game()
+        game_state = 'start_menu'
+
+
+def update_menus():
+    # Start menu
+    if game_state == 'start_menu':
+        set_music(0.5, 0)
+
+    # Intro
+    if game_state == 'intro':
+        if frame_count % 2 == 0:
+            story_rect.y -= 1
+
+    # Game over and outro
+    if game_state in ('game_over', 'evac'):
+        set_music(0.5, 0)
+
+    if game_state == 'evac':
+        if frame_count % 2 == 0:
+            evac_rect.y -= 1
+
 
+def draw_menus():
     # Start menu
     if game_state == 'start_menu':
-        bg_music.set_volume(0)
         screen.blit(start_menu_bg, start_menu_bg_rect)
         screen.blit(start_button, start_button_rect)
         screen.blit(credits_button, credits_button_rect)
@@ -971,17 +1100,12 @@ while running:
     if game_state == 'intro':
         screen.blit(intro_bg, intro_bg_rect)
         screen.blit(story, story_rect)
-        if frame_count % 2 == 0:
-            story_rect.y -= 1
 
         if story_rect.y < -50:
             screen.blit(intro_text, intro_text_rect)
 
     # Game over
     if game_state == 'game_over':
-        main_menu_music.set_volume(0.5)
-        bg_music.set_volume(0)
-
         screen.blit(intro_bg, intro_bg_rect)
         screen.blit(game_over_text, game_over_text_rect)
         screen.blit(play_again_text, play_again_text_rect)
@@ -989,178 +1113,593 @@ while running:
 
     # Outro
     if game_state == 'evac':
-        main_menu_music.set_volume(0.5)
-        bg_music.set_volume(0)
-
         screen.blit(outro_bg, outro_bg_rect)
         screen.blit(evac, evac_rect)
-        if frame_count % 2 == 0:
-            evac_rect.y -= 1
 
         if evac_rect.y < -50:
             screen.blit(outro_text, outro_text_rect)
 
-    # Game
-    if game_state == 'game':
-        if frame_count % 60 == 0:
-            seconds_count += 1
-            if seconds_count == 60:
-                seconds_count = 0
-                minutes_count += 1
 
-        # Background music
-        bg_music.set_volume(0.5)
+def update_game():
+    global seconds_count, minutes_count, grenade_timer, fire_timer, game_state, mouse_pos
+
+    # Input of this tick
+    mouse_pos = read_mouse_pos()
+    if input_recorder is not None:
+        input_recorder.record(mouse_pos)
+
+    # Where the camera and player were before this tick, for drawing between ticks
+    camera.save_offset()
+    player.previous_pos.update(player.original_pos)
+
+    # Chunks around the view are generated ahead of the camera, before anything needs them.
+    # Two chunks out, as far as the flow field reaches from the player
+    world.prefetch(camera.get_view_rect(), margin=2)
+
+    if frame_count % 60 == 0:
+        seconds_count += 1
+        if seconds_count == 60:
+            seconds_count = 0
+            minutes_count += 1
+
+    update_timer()
 
-        # Spawn enemies
-        if frame_count % RIPPER_SPAWN_RATE == 0:
-            spawn_enemy(camera, enemies, "ripper")
+    # Background music
+    bg_music.set_volume(0.5)
 
-        if minutes_count >= 3 and frame_count % ARACHNID_SPAWN_RATE == 0:
-            spawn_enemy(camera, enemies, "arachnid")
+    # Spawn enemies
+    if frame_count % RIPPER_SPAWN_RATE == 0:
+        spawn_enemy(camera, enemies, "ripper")
 
-        if minutes_count >= 6 and frame_count % RHINO_SPAWN_RATE == 0:
-            spawn_enemy(camera, enemies, "rhino")
+    if minutes_count >= 3 and frame_count % ARACHNID_SPAWN_RATE == 0:
+        spawn_enemy(camera, enemies, "arachnid")
 
-        # Spawn power-ups
-        if minutes_count >= 1 and frame_count % GRENADE_SPAWN_RATE == 0:
-            spawn_power_up(camera, power_ups, "grenade")
+    if minutes_count >= 6 and frame_count % RHINO_SPAWN_RATE == 0:
+        spawn_enemy(camera, enemies, "rhino")
 
-        if minutes_count >= 1 and frame_count % SHOOTING_SPEED_SPAWN_RATE == 0:
-            spawn_power_up(camera, power_ups, "shooting_speed")
+    # Spawn power-ups
+    if minutes_count >= 1 and frame_count % GRENADE_SPAWN_RATE == 0:
+        spawn_power_up(camera, power_ups, "grenade")
 
-        if minutes_count >= 5 and frame_count % HP_SPAWN_RATE == 0:
-            spawn_power_up(camera, power_ups, "hp")
+    if minutes_count >= 1 and frame_count % SHOOTING_SPEED_SPAWN_RATE == 0:
+        spawn_power_up(camera, power_ups, "shooting_speed")
 
-        if minutes_count >= 6 and frame_count % FIRE_SPAWN_RATE == 0:
-            spawn_power_up(camera, power_ups, "fire")
+    if minutes_count >= 5 and frame_count % HP_SPAWN_RATE == 0:
+        spawn_power_up(camera, power_ups, "hp")
+
+    if minutes_count >= 6 and frame_count % FIRE_SPAWN_RATE == 0:
+        spawn_power_up(camera, power_ups, "fire")
+
+    phase_timer.mark('spawning')
+
+    # Update enemies, the flow field is only rebuilt when the player enters another tile
+    flow_field.update(player.rect.centerx // TILE_SIZE, player.rect.centery // TILE_SIZE)
+    if swarm is not None:
+        damage = swarm.update(player.original_pos, player.rect, player.health > 0, flow_field.snapshot())
+        if damage:
+            player.health -= damage
+            player.hurt_sound.play()
+    else:
+        enemy_grid.clear()
+        for enemy in enemies:
+            enemy_grid.insert(enemy, enemy.original_pos.x, enemy.original_pos.y)
 
-        # Update enemies
         for enemy in enemies:
-            enemy.update(player, camera, enemies, tiles)
+            enemy.update(player, enemy_grid, flow_field)
             enemy.frames_since_last_damage += 1
 
-        # Update player
-        player.update()
+        # Index enemy bounds: bullets test the colliders and blasts the sprite rects inside them
+        bounds_grid.clear()
+        for enemy in enemies:
+            bounds_grid.insert_rect(enemy, enemy.rect.union(enemy.colliderect))
+
+    phase_timer.mark('enemies')
+
+    # Update player
+    player.update()
+
+    phase_timer.mark('player')
+
+    # Entities keep world positions, the camera offset is only applied when drawing
+    animate(grenades, frame_cache.get('grenade_explosion'))
+
+    animate(fires, frame_cache.get('ring_of_fire'))
+    for fire in fires:
+        follow_camera(fire)
+
+    update_power_ups()
+
+    phase_timer.mark('pickups')
+
+    # Automatically shoot at the closest enemy every 20 frames
+    if frame_count % player.shoot_rate == 0:
+        player.shoot_bullet(bullets, camera, enemy_grid)
+
+    # Update bullets, missed shots are destroyed once they expire or leave the view
+    view_rect = camera.get_view_rect()
+    bullet_rect = pygame.Rect(0, 0, BULLET_SIZE, BULLET_SIZE)
+    for bullet in bullets:
+        bullets.x[bullet] += bullets.dx[bullet] * BULLET_SPEED
+        bullets.y[bullet] += bullets.dy[bullet] * BULLET_SPEED
+        bullets.lifetime[bullet] -= 1
+        bullet_rect.center = (bullets.x[bullet], bullets.y[bullet])
+        if (bullets.lifetime[bullet] <= 0 or not view_rect.colliderect(bullet_rect)
+                or (world_rect is not None and not world_rect.colliderect(bullet_rect))):
+            bullets.destroy(bullet)
+            continue
+
+        if swarm is not None:
+            hit = swarm.hit_test(bullet_rect)
+            if hit is not None:
+                swarm.take_damage([hit], 5)
+                sound_bank.get('bug_shot').play()
+                bullets.destroy(bullet)
+            continue
+
+        # Broad phase: only the enemies whose bounds share a grid cell with the bullet
+        for enemy in bounds_grid.query_rect(bullet_rect):
+            if enemy.alive() and bullet_rect.colliderect(enemy.colliderect):
+                enemy.take_damage(5)
+                if enemy.health <= 0:
+                    enemies.remove(enemy)
+                bullets.destroy(bullet)
+                break
+
+    phase_timer.mark('bullets')
+
+    # Blasts of this frame, their damage is applied in one pass
+    blasts = []
+
+    # Drop grenades after 3 minutes (180 seconds) of gameplay and explode every 5 seconds (300 frames)
+    if minutes_count * 60 + seconds_count >= 10:
+        if player.grenades > 0:
+            if frame_count % 300 == 0:
+                grenade_timer = 50
+                for grenade in range(player.grenades):
+                    throw_grenade(10)
+
+            if grenade_timer > 0:
+                grenade_timer -= 1
+
+            # Remove grenade and deal damage to enemies in the area after 300 frames
+            if grenade_timer == 0:
+                explode_grenades(blasts)
+
+    # Set off ring of fire after 5 minutes (300 seconds) of gameplay and explode every 5 seconds (300 frames)
+    if minutes_count * 60 + seconds_count >= 10:
+        if player.ring_of_fire:
+            if frame_count % player.ring_of_fire_rate == 0:
+                fire_timer = 50
+                set_off_ring_of_fire(20)
 
-        # Apply the camera offset to all tiles and sprites
-        for tile in tiles:
-            camera.apply(tile)
+            if fire_timer > 0:
+                fire_timer -= 1
 
-        for sprite in players:
-            camera.apply(sprite)
+            # Remove grenade and deal damage to enemies in the area after 300 frames
+            if fire_timer == 0:
+                explode_ring_of_fire(blasts)
 
-        for grenade in grenades:
-            camera.apply(grenade)
-            grenade.update()
+    phase_timer.mark('pickups')
 
-        for fire in fires:
-            fire.update()
+    if blasts:
+        apply_area_damage(blasts, bounds_grid, enemies)
 
-        for power_up in power_ups:
-            camera.apply(power_up)
-            power_up.update()
+    phase_timer.mark('aoe')
 
-        # Automatically shoot at the closest enemy every 20 frames
-        if frame_count % player.shoot_rate == 0:
-            player.shoot_bullet(bullets, camera, enemies)
+    # Conditions for game over
+    if player.health <= 0 and player.dead_sound_flag:
+        game_state = 'game_over'
+        player.dead_sound.play()
+        player.dead_sound_flag = False
 
-        # Update bullets
-        for bullet in bullets:
-            bullet.update(camera)
-            for enemy in enemies:
-                if bullet.rect.colliderect(enemy.colliderect):
-                    enemy.take_damage(5)
-                    if enemy.health <= 0:
-                        enemies.remove(enemy)
-                    bullets.remove(bullet)
-                    break
+    if timeout and player.rect.colliderect(get_evac_zone(TILE_SIZE)):
+        game_state = 'evac'
+
+    elif timeout:
+        game_state = 'game_over'
+
+
+def draw_game(alpha=None):
+    # alpha is how far the frame is from the last tick to the next one. The camera and player
+    # are drawn that far along their last move, everything else where the last tick left it
+    player_pos = player.original_pos
+    if alpha is not None:
+        offset = camera.offset
+        camera.offset = camera.interpolate(alpha)
+        player_pos = player.previous_pos.lerp(player.original_pos, alpha)
+        player.rect.topleft = player_pos
+
+    # Fill the screen black
+    screen.fill((0, 0, 0))
+
+    # Draw the visible background chunks
+    background.draw(screen, camera.offset)
+
+    phase_timer.mark('tiles')
+
+    # Draw evacuation zone
+    if evac_time:
+        draw_overlay(screen, camera, 180, 180, TILE_SIZE)
+
+    phase_timer.mark('draw')
+
+    # Draw enemies
+    if swarm is not None:
+        swarm.draw(screen, camera.offset)
+    else:
+        camera.draw(screen, enemies)
+
+    # Draw power-ups
+    camera.draw_images(screen, get_power_up_images())
+
+    # Draw player
+    camera.draw(screen, players)
+
+    # Draw the player's health bar
+    player.draw_health_bar(screen, camera, player_pos)
 
-        # Drop grenades after 3 minutes (180 seconds) of gameplay and explode every 5 seconds (300 frames)
-        if minutes_count * 60 + seconds_count >= 10:
-            if player.grenades > 0:
-                if frame_count % 300 == 0:
-                    grenade_timer = 50
-                    for grenade in range(player.grenades):
-                        Grenade.throw_grenade(grenades, 10)
+    # Draw bullets
+    camera.draw_images(screen, get_bullet_images())
 
-                if grenade_timer > 0:
-                    grenade_timer -= 1
+    # Draw grenades on the screen
+    camera.draw_images(screen, get_animated_images(grenades, frame_cache.get('grenade_explosion')))
 
-                # Remove grenade and deal damage to enemies in the area after 300 frames
-                if grenade_timer == 0:
-                    Grenade.explode(grenades, enemies)
+    # Draw fires on the screen
+    camera.draw_images(screen, get_animated_images(fires, frame_cache.get('ring_of_fire')))
 
-        # Set off ring of fire after 5 minutes (300 seconds) of gameplay and explode every 5 seconds (300 frames)
-        if minutes_count * 60 + seconds_count >= 10:
-            if player.ring_of_fire:
-                if frame_count % player.ring_of_fire_rate == 0:
-                    fire_timer = 50
-                    RingOfFire.set_off(fires, 20)
+    phase_timer.mark('camera')
 
-                if fire_timer > 0:
-                    fire_timer -= 1
+    # Render timer and power-ups UI
+    render_timer()
+    render_power_up_ui()
 
-                # Remove grenade and deal damage to enemies in the area after 300 frames
-                if fire_timer == 0:
-                    RingOfFire.explode(fires, enemies)
+    if alpha is not None:
+        camera.offset = offset
+        player.rect.topleft = player.original_pos
 
-        # Fill the screen black
-        screen.fill((0, 0, 0))
+    phase_timer.mark('draw')
 
-        # Get visible tiles
-        visible_tiles = get_visible_tiles(tiles, camera)
 
-        # Draw visible tiles
-        for tile in visible_tiles:
-            screen.blit(tile.image, tile.rect)
+def toggle_profiler():
+    global show_profiler, phase_timer, profiler_overlay
+
+    show_profiler = not show_profiler
+    if show_profiler:
+        if profiler_overlay is None:
+            profiler_overlay = ProfilerOverlay(ui_font, PROFILER_PHASES, PROFILER_COUNTERS)
+        phase_timer = PhaseTimer(history=profiler_overlay.samples)
+    else:
+        phase_timer = NullTimer()
 
-        # Draw evacuation zone
-        if evac_time:
-            overlay = draw_overlay(screen, camera, 180, 180, TILE_SIZE)
 
-        # Draw enemies
-        enemies.draw(screen)
+def get_entity_counts():
+    return {
+        'enemies': len(swarm) if swarm is not None else len(enemies),
+        'bullets': len(bullets),
+        'power_ups': len(power_ups),
+        'grenades': len(grenades),
+        'fires': len(fires),
+    }
 
-        # Draw power-ups
-        power_ups.draw(screen)
 
-        # Draw player
-        players.draw(screen)
+def start_game():
+    # Every game starts from a fresh state and a known seed, which is all a recording needs besides the input
+    global game_state, game_seed, input_recorder
 
-        # Draw the player's health bar
-        player.draw_health_bar(screen, camera)
+    if not game_assets_ready:
+        finish_loading_game_assets()
 
-        # Draw bullets
-        bullets.draw(screen)
+    reset_game()
+    game_seed = seed if seed is not None else random.randrange(2 ** 32)
+    rng.seed(game_seed)
+    if record_path is not None:
+        input_recorder = InputRecorder(game_seed)
+    game_state = 'game'
 
-        # Draw grenades on the screen
-        grenades.draw(screen)
 
-        # Draw fires on the screen
-        fires.draw(screen)
+def finish_recording():
+    global input_recorder, games_recorded
 
-        # Render timer and power-ups UI
-        render_timer()
-        render_power_up_ui()
+    if input_recorder is not None:
+        # Every game of a session gets its own file, the first one the path it was given
+        games_recorded += 1
+        path = record_path
+        if games_recorded > 1:
+            root, extension = os.path.splitext(record_path)
+            path = '{}-{}{}'.format(root, games_recorded, extension)
+        input_recorder.save(path)
+        input_recorder = None
 
-        # Conditions for game over
-        if player.health <= 0 and player.dead_sound_flag:
-            game_state = 'game_over'
-            player.dead_sound.play()
-            player.dead_sound_flag = False
 
-        if timeout and player.rect.colliderect(overlay):
-            game_state = 'evac'
+def tick():
+    global frame_count, running
+
+    if game_state == 'game':
+        # A replay ends with its recorded input or with the recorded game
+        if input_replay is not None and frame_count >= len(input_replay):
+            running = False
+            return
 
-        elif timeout:
-            game_state = 'game_over'
+        update_game()
+        if game_state != 'game':
+            finish_recording()
+            if input_replay is not None:
+                running = False
+    else:
+        update_menus()
 
-    # Increment the frame count
+    # Increment the frame count, it counts ticks rather than drawn frames
     frame_count += 1
 
-    # Update the display
-    pygame.display.flip()
 
-# Clean up
-pygame.quit()
+def get_idle_timeout():
+    # How long the loop may block waiting for events, None while frames have to keep coming
+    if game_state == 'game' or show_profiler:
+        return None
+    if game_state in SCROLLING_MENUS:
+        return SCROLL_IDLE_TIMEOUT
+    return MENU_IDLE_TIMEOUT
+
+
+def get_scroll_rect():
+    if game_state == 'intro':
+        return story_rect
+    if game_state == 'evac':
+        return evac_rect
+    return None
+
+
+def get_menu_dirty_rect(drawn_menu):
+    # The part of the screen that changed since the last drawn menu frame, drawn_menu is its
+    # (state, scroll rect). A new state redraws everything, scrolling text only where it moved
+    screen_rect = screen.get_rect()
+    if drawn_menu is None or drawn_menu[0] != game_state:
+        return screen_rect
+
+    scroll_rect = get_scroll_rect()
+    if scroll_rect is not None and scroll_rect != drawn_menu[1]:
+        text_rect = intro_text_rect if game_state == 'intro' else outro_text_rect
+        return scroll_rect.union(drawn_menu[1]).union(text_rect).clip(screen_rect)
+    return None
+
+
+def run(max_fps=FPS, interpolate=False):
+    # Fixed timestep: real time piles up in the accumulator and is spent in whole ticks,
+    # as many per frame as needed, so the game speed does not depend on the frame rate
+    accumulator = 0
+    previous_time = time.perf_counter()
+
+    # Nothing is simulated or drawn while the window is minimised or unfocused
+    paused = False
+
+    # (state, scroll rect) of the menu frame on screen, None when it has to be redrawn in full
+    drawn_menu = None
+
+    while running:
+        # Menus block until something happens instead of spinning through frames
+        idle_timeout = 0 if paused else get_idle_timeout()
+        if idle_timeout is not None:
+            events = [pygame.event.wait(idle_timeout)] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+
+        # Event handling
+        for event in events:
+            if event.type in (pygame.WINDOWFOCUSLOST, pygame.WINDOWMINIMIZED):
+                paused = True
+            elif event.type in (pygame.WINDOWFOCUSGAINED, pygame.WINDOWRESTORED) and paused:
+                # Time spent paused is not simulated
+                paused = False
+                accumulator = 0
+                previous_time = time.perf_counter()
+                drawn_menu = None
+            elif event.type == pygame.WINDOWEXPOSED:
+                drawn_menu = None
+            handle_event(event)
+
+        if paused:
+            continue
+
+        # Cap the frame rate, 0 draws as often as possible
+        clock.tick(max_fps)
+
+        # Convert the game assets as soon as the worker has decoded them
+        if not game_assets_ready and asset_loader.ready():
+            finish_loading_game_assets()
+
+        current_time = time.perf_counter()
+        accumulator += current_time - previous_time
+        previous_time = current_time
+
+        # Static menus do not catch up on the time spent waiting, one tick keeps the music right
+        if game_state in STATIC_MENUS:
+            accumulator = min(accumulator, TICK_TIME)
+
+        # Frame times leave out the wait in clock.tick
+        phase_timer.begin_frame()
+
+        ticks = 0
+        while accumulator >= TICK_TIME and ticks < MAX_TICKS_PER_FRAME:
+            tick()
+            accumulator -= TICK_TIME
+            ticks += 1
+
+        # Too far behind to catch up, drop the backlog instead of falling further behind
+        if accumulator >= TICK_TIME:
+            accumulator = 0
+
+        # Game
+        if game_state == 'game':
+            draw_game(accumulator / TICK_TIME if interpolate else None)
+
+            phase_timer.end_frame()
+            if show_profiler:
+                profiler_overlay.draw(screen, phase_timer, get_entity_counts())
+
+            # Update the display
+            pygame.display.flip()
+            drawn_menu = None
+            continue
+
+        # Menus only redraw and update the part of the screen that changed
+        dirty_rect = screen.get_rect() if show_profiler else get_menu_dirty_rect(drawn_menu)
+        if dirty_rect:
+            screen.set_clip(dirty_rect)
+            draw_menus()
+            screen.set_clip(None)
+
+        phase_timer.end_frame()
+        if show_profiler:
+            profiler_overlay.draw(screen, phase_timer, get_entity_counts())
+
+        if dirty_rect:
+            pygame.display.update(dirty_rect)
+
+        scroll_rect = get_scroll_rect()
+        drawn_menu = (game_state, scroll_rect.copy() if scroll_rect is not None else None)
+
+
+def run_headless(frames):
+    # Plays the game state from a fresh start for up to the given number of frames, as fast as possible.
+    # The same seed always gives the same game, so reports can be compared between runs
+    start_game()
+
+    frame_times = []
+    started = time.perf_counter()
+    while running and game_state == 'game' and len(frame_times) < frames:
+        frame_started = time.perf_counter()
+
+        # Nothing reads SDL's events, but the queue still has to be drained
+        pygame.event.pump()
+
+        phase_timer.begin_frame()
+        tick()
+        if game_state == 'game':
+            draw_game()
+        phase_timer.end_frame()
+
+        frame_times.append(time.perf_counter() - frame_started)
+    elapsed = time.perf_counter() - started
+
+    frame_times.sort()
+    frames_run = len(frame_times)
+
+    def percentile(fraction):
+        return round(frame_times[min(int(frames_run * fraction), frames_run - 1)] * 1000, 3) if frames_run else 0
+
+    return {
+        'seed': game_seed,
+        'replay': input_replay is not None,
+        'backend': 'swarm' if swarm is not None else 'sprites',
+        'workers': len(getattr(swarm, 'workers', [])),
+        'frames': frames_run,
+        'elapsed_s': round(elapsed, 3),
+        'mean_ms': round(elapsed / frames_run * 1000, 3) if frames_run else 0,
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'max_ms': percentile(1),
+        'state': game_state,
+        'game_time': '{:02d}:{:02d}'.format(minutes_count, max(seconds_count, 0)),
+        'player_health': player.health,
+        'player_pos': [round(player.original_pos.x, 3), round(player.original_pos.y, 3)],
+        'enemies': len(swarm) if swarm is not None else len(enemies),
+        'bullets': len(bullets),
+        'power_ups': len(power_ups),
+        'frame_cache': frame_cache.stats(),
+        'sound_bank': sound_bank.stats(),
+        'text_cache': text_cache.stats(),
+        'world': world.stats(),
+        'flow_field': flow_field.stats(),
+    }
+
+
+# Seeded in headless mode, so a run can be repeated exactly
+rng = random.Random()
+
+# Per-phase frame timings, only recorded when a PhaseTimer is put in place
+phase_timer = NullTimer()
+show_profiler = False
+profiler_overlay = None
+
+# Seed of every game and the recording or replay of its input, set from the command line
+seed = None
+game_seed = None
+record_path = None
+input_recorder = None
+games_recorded = 0
+input_replay = None
+mouse_pos = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+
+# Game objects, created by the asset loading functions and reset_game
+headless = False
+game_assets_ready = False
+endless_world = False
+swarm = None
+world = None
+enemies = pygame.sprite.Group()
+bullets = EntityStore(BULLET_COMPONENTS)
+grenades = EntityStore(GRENADE_COMPONENTS, 8)
+fires = EntityStore(FIRE_COMPONENTS, 4)
+power_ups = EntityStore(POWER_UP_COMPONENTS, 8)
+
+# Game state
+running = True
+game_state = 'start_menu'
+
+frame_count = 0
+seconds_count = -1
+minutes_count = 0
+timeout = False
+evac_time = False
+grenade_timer = 0
+fire_timer = 0
+
+
+def main(argv=None):
+    global seed, record_path, input_replay
+
+    args = parse_args(argv)
+
+    seed = args.seed
+    if args.headless and seed is None:
+        seed = 0
+    record_path = args.record
+    if args.replay:
+        try:
+            input_replay = InputReplay.load(args.replay)
+        except (OSError, ValueError) as error:
+            sys.exit('Cannot replay {}: {}'.format(args.replay, error))
+        seed = input_replay.seed
+
+    init_display(args.headless)
+    load_menu_assets()
+
+    try:
+        if args.headless:
+            load_game_assets(args.swarm, args.endless, args.workers)
+            frames = len(input_replay) if input_replay is not None else args.frames
+            print(json.dumps(run_headless(frames), indent=2))
+        else:
+            # The start menu shows while the rest loads
+            start_loading_game_assets(args.swarm, args.endless, args.workers)
+
+            # A replay goes straight into the recorded game
+            if input_replay is not None:
+                start_game()
+            run(args.max_fps, args.interpolate)
+    finally:
+        # Keep the recording of a game cut short by closing the window
+        finish_recording()
+
+        # Stop the swarm workers and free their shared memory, and the chunk worker of the world
+        if swarm is not None:
+            swarm.close()
+        if world is not None:
+            world.stop()
+
+    # Clean up
+    pygame.quit()
+
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import time
+from collections import deque
+
+import pygame
+
+
+class PhaseTimer:
+    def __init__(self, history=None):
+        # Seconds spent in each phase of the current frame, phases are marked when they end
+        self.phases = {}
+        self.started = 0
+        self.last = 0
+
+        # (frame seconds, phases) of finished frames, oldest first
+        self.history = deque(maxlen=history)
+
+    def begin_frame(self):
+        self.phases = {}
+        self.started = self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self.last
+        self.last = now
+
+    def end_frame(self):
+        self.history.append((time.perf_counter() - self.started, self.phases))
+
+    def clear(self):
+        self.history.clear()
+
+
+class NullTimer:
+    # Stands in for PhaseTimer when nothing is measured, every call does nothing
+    def begin_frame(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def clear(self):
+        pass
+
+
+class ProfilerOverlay:
+    def __init__(self, font, phases, counters, samples=120, average_frames=30, budget_ms=1000 / 60):
+        self.font = font
+        # (phase, label) pairs and counter names in the order they are shown
+        self.phases = phases
+        self.counters = counters
+        self.samples = samples
+        self.average_frames = average_frames
+        self.budget_ms = budget_ms
+
+        self.line_height = font.get_linesize()
+        self.graph_height = 50
+        self.width = samples * 2 + 20
+        lines = 2 + len(phases) + 1 + len(counters)
+        self.height = self.graph_height + lines * self.line_height + 30
+
+        # Reused every frame, the overlay should not add allocations of its own
+        self.panel = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+
+    def draw_graph(self, history, top):
+        # One bar per frame, the line is the frame budget, twice the budget fills the graph
+        scale = self.graph_height / (self.budget_ms * 2)
+        bottom = top + self.graph_height
+        left = 10 + (self.samples - len(history)) * 2
+        for i, (total, _) in enumerate(history):
+            total_ms = total * 1000
+            bar_height = max(min(int(total_ms * scale), self.graph_height), 1)
+            color = (80, 220, 80) if total_ms <= self.budget_ms else (230, 60, 60)
+            pygame.draw.rect(self.panel, color, (left + i * 2, bottom - bar_height, 2, bar_height))
+        budget_y = bottom - int(self.budget_ms * scale)
+        pygame.draw.line(self.panel, (255, 255, 255), (10, budget_y), (self.width - 10, budget_y))
+
+    def draw_text(self, text, x, y, color=(255, 255, 255)):
+        self.panel.blit(self.font.render(text, False, color), (x, y))
+
+    def draw_row(self, label, value, y):
+        self.draw_text(label, 10, y, (200, 200, 200))
+        self.draw_text(value, self.width - 90, y)
+
+    def draw(self, surface, timer, counts, position=(10, 10)):
+        # counts maps every counter name to its current value
+        self.panel.fill((0, 0, 0, 170))
+
+        history = list(timer.history)[-self.samples:]
+        self.draw_graph(history, 10)
+
+        # Phase costs averaged over the last frames, single frames are too noisy to read
+        recent = history[-self.average_frames:]
+        frames = max(len(recent), 1)
+        y = self.graph_height + 20
+        frame_ms = sum(total for total, _ in recent) * 1000 / frames
+        worst_ms = max((total for total, _ in recent), default=0) * 1000
+        self.draw_text('frame {:6.2f} ms  max {:6.2f} ms'.format(frame_ms, worst_ms), 10, y)
+        y += self.line_height * 2
+
+        for phase, label in self.phases:
+            phase_ms = sum(phases.get(phase, 0) for _, phases in recent) * 1000 / frames
+            self.draw_row(label, '{:6.2f} ms'.format(phase_ms), y)
+            y += self.line_height
+
+        y += self.line_height
+        for name in self.counters:
+            self.draw_row(name, '{:6d}'.format(counts[name]), y)
+            y += self.line_height
+
+        surface.blit(self.panel, position)
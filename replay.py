@@ -0,0 +1,69 @@
+import struct
+import sys
+from array import array
+
+# File layout: header, then one little-endian int16 (x, y) mouse position per tick
+REPLAY_MAGIC = b'STIR'
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct('<4sHQI')
+
+# The header holds the seed as an unsigned 64-bit int
+MAX_SEED = 2 ** 64 - 1
+
+
+class InputRecorder:
+    def __init__(self, seed):
+        # Checked up front, so a game is never played to the end only to fail when it is saved
+        if not 0 <= seed <= MAX_SEED:
+            raise ValueError('seed {} does not fit an input recording'.format(seed))
+        self.seed = seed
+        self.positions = array('h')
+
+    def __len__(self):
+        return len(self.positions) // 2
+
+    def record(self, mouse_pos):
+        self.positions.append(int(mouse_pos[0]))
+        self.positions.append(int(mouse_pos[1]))
+
+    def save(self, path):
+        positions = array('h', self.positions)
+        if sys.byteorder == 'big':
+            positions.byteswap()
+        header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, len(self))
+        with open(path, 'wb') as file:
+            file.write(header)
+            file.write(positions.tobytes())
+
+
+class InputReplay:
+    def __init__(self, seed, positions):
+        self.seed = seed
+        self.positions = positions
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        if len(data) < REPLAY_HEADER.size:
+            raise ValueError('{} is too short to be an input recording'.format(path))
+        magic, version, seed, ticks = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError('{} is not an input recording'.format(path))
+        if version != REPLAY_VERSION:
+            raise ValueError('{} has input recording version {}, expected {}'.format(path, version, REPLAY_VERSION))
+
+        positions = array('h')
+        positions.frombytes(data[REPLAY_HEADER.size:REPLAY_HEADER.size + ticks * 4])
+        if len(positions) != ticks * 2:
+            raise ValueError('{} is truncated'.format(path))
+        if sys.byteorder == 'big':
+            positions.byteswap()
+        return cls(seed, positions)
+
+    def __len__(self):
+        return len(self.positions) // 2
+
+    def get(self, tick):
+        return self.positions[tick * 2], self.positions[tick * 2 + 1]
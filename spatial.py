@@ -0,0 +1,144 @@
+import heapq
+
+
+class SpatialHash:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.bounds = None
+
+    def cell_key(self, x, y):
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def clear(self):
+        self.cells.clear()
+        self.bounds = None
+
+    def grow_bounds(self, col, row):
+        # Smallest box of cells that ever held an item since the last clear, it never shrinks
+        if self.bounds is None:
+            self.bounds = [col, row, col, row]
+        else:
+            bounds = self.bounds
+            if col < bounds[0]:
+                bounds[0] = col
+            elif col > bounds[2]:
+                bounds[2] = col
+            if row < bounds[1]:
+                bounds[1] = row
+            elif row > bounds[3]:
+                bounds[3] = row
+
+    def insert(self, item, x, y):
+        key = self.cell_key(x, y)
+        self.grow_bounds(*key)
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [item]
+        else:
+            cell.append(item)
+
+    def remove(self, item, x, y):
+        key = self.cell_key(x, y)
+        cell = self.cells[key]
+        cell.remove(item)
+        if not cell:
+            del self.cells[key]
+
+    def move(self, item, old_x, old_y, new_x, new_y):
+        # Most moves stay inside the same cell, those cost two divisions and nothing else
+        if self.cell_key(old_x, old_y) != self.cell_key(new_x, new_y):
+            self.remove(item, old_x, old_y)
+            self.insert(item, new_x, new_y)
+
+    def query(self, x, y, radius):
+        # Every item in the cells touching the square around (x, y), callers do the exact distance test
+        first_col, first_row = self.cell_key(x - radius, y - radius)
+        last_col, last_row = self.cell_key(x + radius, y + radius)
+        cells = self.cells
+        found = []
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                cell = cells.get((col, row))
+                if cell:
+                    found.extend(cell)
+        return found
+
+    def rect_keys(self, rect):
+        first_col, first_row = self.cell_key(rect.left, rect.top)
+        last_col, last_row = self.cell_key(rect.right - 1, rect.bottom - 1)
+        for col in range(first_col, last_col + 1):
+            for row in range(first_row, last_row + 1):
+                yield col, row
+
+    def insert_rect(self, item, rect):
+        # Large items go into every cell they overlap, so a query never has to look further out
+        for key in self.rect_keys(rect):
+            self.grow_bounds(*key)
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = [item]
+            else:
+                cell.append(item)
+
+    def query_rect(self, rect):
+        # Every item in the cells the rect overlaps, each one once, callers do the exact overlap test
+        cells = self.cells
+        found = []
+        keys = 0
+        for key in self.rect_keys(rect):
+            cell = cells.get(key)
+            if cell:
+                found.extend(cell)
+            keys += 1
+        if keys > 1:
+            found = list(dict.fromkeys(found))
+        return found
+
+    def ring_keys(self, col, row, ring):
+        if ring == 0:
+            yield col, row
+            return
+        for ring_col in range(col - ring, col + ring + 1):
+            yield ring_col, row - ring
+            yield ring_col, row + ring
+        for ring_row in range(row - ring + 1, row + ring):
+            yield col - ring, ring_row
+            yield col + ring, ring_row
+
+    def nearest(self, x, y, position, count=1, radius=None, accept=None):
+        # Up to count items closest to (x, y), closest first, found by searching rings of cells outward.
+        # position(item) gives the point to measure to, accept(item) can rule items out
+        if self.bounds is None:
+            return []
+        col, row = self.cell_key(x, y)
+        first_col, first_row, last_col, last_row = self.bounds
+        last_ring = max(col - first_col, last_col - col, row - first_row, last_row - row)
+        if radius is not None:
+            last_ring = min(last_ring, int(radius // self.cell_size) + 1)
+            radius_squared = radius * radius
+
+        cells = self.cells
+        best = []
+        order = 0
+        for ring in range(last_ring + 1):
+            # Nothing in this ring or beyond can be closer than (ring - 1) cells away
+            if len(best) == count and ((ring - 1) * self.cell_size) ** 2 > -best[0][0]:
+                break
+            for key in self.ring_keys(col, row, ring):
+                cell = cells.get(key)
+                if not cell:
+                    continue
+                for item in cell:
+                    if accept is not None and not accept(item):
+                        continue
+                    item_x, item_y = position(item)
+                    distance_squared = (item_x - x) ** 2 + (item_y - y) ** 2
+                    if radius is not None and distance_squared > radius_squared:
+                        continue
+                    order += 1
+                    if len(best) < count:
+                        heapq.heappush(best, (-distance_squared, order, item))
+                    elif distance_squared < -best[0][0]:
+                        heapq.heapreplace(best, (-distance_squared, order, item))
+        return [item for _, _, item in sorted(best, key=lambda entry: (-entry[0], entry[1]))]
@@ -0,0 +1,336 @@
+import numpy as np
+
+from flow import DIRECTIONS
+
+
+ENEMY_TYPES = ('ripper', 'arachnid', 'rhino')
+
+# Sprite enemies keep the 90x75 rect of the arachnid frames, colliders are placed relative to it
+ENEMY_RECT_SIZE = (90, 75)
+ENEMY_RECT_CENTRE = np.array(ENEMY_RECT_SIZE) // 2
+COLLIDER_OFFSETS = np.array([(38, 0), (20, 12), (-37, 12)], dtype=np.float64)
+COLLIDER_SIZES = np.array([(14, 14), (50, 50), (165, 50)], dtype=np.float64)
+SEPARATION_DISTANCES = COLLIDER_SIZES[:, 0] + 2
+
+# How far colliders reach left and right of the enemy position
+COLLIDER_LEFT_REACH = -COLLIDER_OFFSETS[:, 0].min()
+COLLIDER_RIGHT_REACH = (COLLIDER_OFFSETS[:, 0] + COLLIDER_SIZES[:, 0]).max()
+
+# Largest enemy frame, the rhino, used to cull enemies that are off screen
+MAX_FRAME_SIZE = (200, 75)
+
+ANIMATION_SPEEDS = np.array([0.1, 0.1, 0.05])
+ANIMATION_FRAMES = np.array([2, 2, 3])
+
+DAMAGE_COOLDOWN = 60
+
+# Unit steps of the flow field by direction code, code 0 has no step
+FLOW_STEPS = np.array([(0, 0)] + DIRECTIONS[1:], dtype=np.float64)
+
+# Structure of arrays, one row per enemy: name, dtype and shape of a row
+COMPONENTS = [
+    ('positions', np.float64, (2,)),
+    ('speeds', np.float64, ()),
+    ('health', np.float64, ()),
+    ('damage', np.float64, ()),
+    ('types', np.int8, ()),
+    ('cooldowns', np.int32, ()),
+    ('animation', np.float64, ()),
+    ('facing_left', np.bool_, ()),
+]
+
+
+def neighbour_pairs(positions, queries, cell_size):
+    # Bin everyone into cells at least as large as the separation distance, then pair each
+    # queried enemy with everyone in its own and the eight surrounding cells
+    cells = np.floor(positions / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    stride = cells[:, 1].max() + 2
+    keys = cells[:, 0] * stride + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    query_keys = keys[queries]
+
+    pair_i = []
+    pair_j = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour_keys = query_keys + dx * stride + dy
+            starts = np.searchsorted(sorted_keys, neighbour_keys, side='left')
+            counts = np.searchsorted(sorted_keys, neighbour_keys, side='right') - starts
+            total = counts.sum()
+            if total == 0:
+                continue
+            run_starts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+            pair_i.append(np.repeat(queries, counts))
+            pair_j.append(order[np.arange(total) + run_starts])
+    if not pair_i:
+        return queries[:0], queries[:0]
+    return np.concatenate(pair_i), np.concatenate(pair_j)
+
+
+def separation(positions, types, queries, separation_push):
+    # Push on each queried enemy away from everyone in positions closer than its separation distance
+    count = len(positions)
+    separation = np.zeros((count, 2))
+    if count < 2:
+        return separation[queries]
+
+    # Each enemy type gets a grid sized to its own separation distance, so a few rhinos
+    # do not make every ripper look through rhino-sized cells
+    query_types = types[queries]
+    for enemy_type in np.unique(query_types):
+        distance_allowed = SEPARATION_DISTANCES[enemy_type]
+        pair_i, pair_j = neighbour_pairs(positions, queries[query_types == enemy_type], distance_allowed)
+        offsets = positions[pair_j] - positions[pair_i]
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        close = (distances > 0) & (distances < distance_allowed)
+
+        pair_i = pair_i[close]
+        pushes = offsets[close] / distances[close, None] * separation_push
+        separation[:, 0] -= np.bincount(pair_i, weights=pushes[:, 0], minlength=count)
+        separation[:, 1] -= np.bincount(pair_i, weights=pushes[:, 1], minlength=count)
+    return separation[queries]
+
+
+def flow_steps(flow, positions):
+    # Flow field direction codes under the rect centres, 0 outside the field
+    first_col, first_row, size, tile_size, directions = flow
+    cells = np.floor((positions + ENEMY_RECT_CENTRE) / tile_size).astype(np.int64) - (first_col, first_row)
+    inside = np.flatnonzero(((cells >= 0) & (cells < size)).all(axis=1))
+    steps = np.zeros(len(positions), dtype=np.uint8)
+    steps[inside] = np.frombuffer(directions, dtype=np.uint8)[cells[inside, 1] * size + cells[inside, 0]]
+    return steps
+
+
+def steer(swarm, queries, neighbours, player_pos, player_rect, player_alive, out, flow=None):
+    # Moves the queried enemies and lets the ones touching the player bite, returns the damage dealt.
+    # neighbours are all the enemies close enough to push a queried one, both are sorted indices.
+    # New positions go to out, so parts of the swarm can be steered at the same time from the same
+    # start positions. Every enemy gets the same arithmetic however the swarm is split up
+    positions = swarm.positions[queries]
+    types = swarm.types[queries]
+    speeds = swarm.speeds[queries]
+
+    # Seek the player, along the flow field (FlowField.snapshot) where it leads somewhere
+    to_player = np.array(player_pos, dtype=np.float64) - positions
+    swarm.facing_left[queries] = to_player[:, 0] < 0
+    lengths = np.hypot(to_player[:, 0], to_player[:, 1])
+    lengths[lengths == 0] = np.inf
+    move = to_player * (speeds / lengths)[:, None]
+    if flow is not None:
+        steps = flow_steps(flow, positions)
+        flowing = steps > 0
+        move[flowing] = FLOW_STEPS[steps[flowing]] * speeds[flowing, None]
+
+    # Every enemy is pushed away from neighbours by where they stood at the start of the frame
+    move += separation(swarm.positions[neighbours], swarm.types[neighbours], np.searchsorted(neighbours, queries),
+                       swarm.separation_push)
+    positions += move
+    out[queries] = positions
+
+    # Contact damage, an enemy can only bite once every DAMAGE_COOLDOWN frames
+    left, top, width, height = player_rect
+    topleft = np.trunc(positions) + COLLIDER_OFFSETS[types]
+    size = COLLIDER_SIZES[types]
+    touching = ((topleft[:, 0] < left + width) & (topleft[:, 0] + size[:, 0] > left) &
+                (topleft[:, 1] < top + height) & (topleft[:, 1] + size[:, 1] > top))
+    cooldowns = swarm.cooldowns[queries]
+    biting = touching & (cooldowns >= DAMAGE_COOLDOWN) & player_alive
+    cooldowns[touching & ~biting] += 1
+    cooldowns[biting] = 0
+    cooldowns += 1
+    swarm.cooldowns[queries] = cooldowns
+    return int(swarm.damage[queries][biting].sum())
+
+
+class Swarm:
+    def __init__(self, frame_cache, separation_push, capacity=256):
+        self.frame_cache = frame_cache
+        self.separation_push = separation_push
+        self.frames = None
+        self.sweep = None
+        self.count = 0
+        self.allocate(capacity)
+
+    def new_array(self, shape, dtype):
+        return np.zeros(shape, dtype=dtype)
+
+    def allocate(self, capacity):
+        # Only the first self.count rows are alive
+        self.capacity = capacity
+        for name, dtype, shape in COMPONENTS:
+            setattr(self, name, self.new_array((capacity,) + shape, dtype))
+
+    def grow(self):
+        old = [getattr(self, name) for name, _, _ in COMPONENTS]
+        self.allocate(self.capacity * 2)
+        for old_array, (name, _, _) in zip(old, COMPONENTS):
+            getattr(self, name)[:self.count] = old_array[:self.count]
+
+    def close(self):
+        # Nothing to release, the arrays are ordinary memory
+        pass
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+        self.sweep = None
+
+    def spawn(self, x, y, enemy_type, speed, health, damage):
+        if self.count == self.capacity:
+            self.grow()
+        i = self.count
+        self.positions[i] = (x, y)
+        self.speeds[i] = speed
+        self.health[i] = health
+        self.damage[i] = damage
+        self.types[i] = ENEMY_TYPES.index(enemy_type)
+        self.cooldowns[i] = 0
+        self.animation[i] = 0
+        self.facing_left[i] = False
+        self.count += 1
+        self.sweep = None
+
+    def remove(self, dead):
+        # Compact the arrays, survivors keep their relative order
+        alive = ~dead
+        count = int(alive.sum())
+        for name, _, _ in COMPONENTS:
+            array = getattr(self, name)
+            array[:count] = array[:self.count][alive]
+        self.count = count
+        self.sweep = None
+
+    def colliders(self):
+        # Left, top, width and height of every collider, in the same truncated pixels as sprite rects
+        types = self.types[:self.count]
+        topleft = np.trunc(self.positions[:self.count]) + COLLIDER_OFFSETS[types]
+        return topleft, COLLIDER_SIZES[types]
+
+    def steer(self, player_pos, player_rect, player_alive, flow):
+        everyone = np.arange(self.count)
+        return steer(self, everyone, everyone, player_pos, player_rect, player_alive, self.positions, flow)
+
+    def update(self, player_pos, player_rect, player_alive, flow=None):
+        count = self.count
+        if count == 0:
+            return 0
+
+        # Animate, facing the player
+        types = self.types[:count]
+        animation = self.animation[:count]
+        animation += ANIMATION_SPEEDS[types]
+        animation[animation >= ANIMATION_FRAMES[types]] = 0
+
+        damage = self.steer(player_pos, tuple(player_rect), player_alive, flow)
+        self.sweep = None
+        return damage
+
+    def nearest(self, origin, count=1, radius=None, view_rect=None):
+        # Indices of up to count enemies closest to origin, closest first, compared by squared distance
+        positions = self.positions[:self.count]
+        candidates = np.arange(self.count)
+        if view_rect is not None:
+            candidates = np.flatnonzero((positions[:, 0] >= view_rect.left) & (positions[:, 0] <= view_rect.right) &
+                                        (positions[:, 1] >= view_rect.top) & (positions[:, 1] <= view_rect.bottom))
+        offsets = positions[candidates] - np.array(origin, dtype=np.float64)
+        distances_squared = np.einsum('ij,ij->i', offsets, offsets)
+        if radius is not None:
+            within = distances_squared <= radius * radius
+            candidates = candidates[within]
+            distances_squared = distances_squared[within]
+        if len(candidates) > count:
+            closest = np.argpartition(distances_squared, count - 1)[:count]
+            candidates = candidates[closest]
+            distances_squared = distances_squared[closest]
+        return candidates[np.argsort(distances_squared, kind='stable')]
+
+    def find_closest_in_view(self, origin, view_rect):
+        # Collider centre of the enemy closest to origin whose position is inside the view
+        closest = self.nearest(origin, 1, view_rect=view_rect)
+        if len(closest) == 0:
+            return None
+        types = self.types[closest[0]]
+        return np.trunc(self.positions[closest[0]]) + COLLIDER_OFFSETS[types] + COLLIDER_SIZES[types] // 2
+
+    def sweep_order(self):
+        # Enemies sorted by x, rebuilt once after enemies move
+        if self.sweep is None:
+            xs = np.trunc(self.positions[:self.count, 0])
+            order = np.argsort(xs, kind='stable')
+            self.sweep = (order, xs[order])
+        return self.sweep
+
+    def between_x(self, low, high):
+        # Indices of enemies whose x lies strictly between low and high
+        order, xs = self.sweep_order()
+        return order[np.searchsorted(xs, low, side='right'):np.searchsorted(xs, high, side='left')]
+
+    def hit_test(self, rect):
+        # Index of the first enemy whose collider overlaps the rect, or None.
+        # Sweep on x: only enemies within collider reach of the rect can touch it
+        candidates = self.between_x(rect.left - COLLIDER_RIGHT_REACH, rect.right + COLLIDER_LEFT_REACH)
+        if len(candidates) == 0:
+            return None
+
+        types = self.types[candidates]
+        topleft = np.trunc(self.positions[candidates]) + COLLIDER_OFFSETS[types]
+        size = COLLIDER_SIZES[types]
+        hits = candidates[(topleft[:, 0] < rect.right) & (topleft[:, 0] + size[:, 0] > rect.left) &
+                          (topleft[:, 1] < rect.bottom) & (topleft[:, 1] + size[:, 1] > rect.top)]
+        return int(hits.min()) if len(hits) else None
+
+    def take_damage(self, indices, amount):
+        # Damage the given enemies and drop the dead ones, returns how many were hit
+        hit = np.zeros(self.count, dtype=bool)
+        hit[indices] = True
+        self.health[:self.count][hit] -= amount
+        dead = self.health[:self.count] <= 0
+        if dead.any():
+            self.remove(dead)
+        return int(hit.sum())
+
+    def damage_circles(self, blasts):
+        # Blasts are circles (x, y, radius, damage) tested against the 90x75 enemy rect. Damage
+        # from every blast is summed first, the dead are removed once, returns how many were hit
+        damage_taken = np.zeros(self.count)
+        for x, y, radius, damage in blasts:
+            candidates = self.between_x(x - radius - ENEMY_RECT_SIZE[0] - 1, x + radius + 1)
+            if len(candidates) == 0:
+                continue
+            topleft = np.trunc(self.positions[candidates])
+            closest_x = np.clip(x, topleft[:, 0], topleft[:, 0] + ENEMY_RECT_SIZE[0])
+            closest_y = np.clip(y, topleft[:, 1], topleft[:, 1] + ENEMY_RECT_SIZE[1])
+            inside = (closest_x - x) ** 2 + (closest_y - y) ** 2 <= radius * radius
+            damage_taken[candidates[inside]] += damage
+
+        hit = damage_taken > 0
+        self.health[:self.count] -= damage_taken
+        dead = self.health[:self.count] <= 0
+        if dead.any():
+            self.remove(dead)
+        return int(hit.sum())
+
+    def draw(self, surface, offset):
+        if self.count == 0:
+            return
+        if self.frames is None:
+            self.frames = [(self.frame_cache.get(enemy_type, 'r'), self.frame_cache.get(enemy_type, 'l'))
+                           for enemy_type in ENEMY_TYPES]
+
+        # Only enemies on screen are turned into blits
+        screen_positions = np.trunc(np.trunc(self.positions[:self.count]) - np.array(offset)).astype(np.int64)
+        view_width, view_height = surface.get_size()
+        visible = np.flatnonzero((screen_positions[:, 0] < view_width) & (screen_positions[:, 1] < view_height) &
+                                 (screen_positions[:, 0] > -MAX_FRAME_SIZE[0]) &
+                                 (screen_positions[:, 1] > -MAX_FRAME_SIZE[1]))
+
+        frames = self.frames
+        surface.blits([(frames[enemy_type][facing_left][int(animation)], position)
+                       for enemy_type, facing_left, animation, position in zip(
+                           self.types[visible].tolist(), self.facing_left[visible].tolist(),
+                           self.animation[visible].tolist(), screen_positions[visible].tolist())],
+                      doreturn=False)
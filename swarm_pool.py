@@ -0,0 +1,161 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from swarm import COMPONENTS, SEPARATION_DISTANCES, Swarm, steer
+
+# Enemies this far outside a strip in x can still share a separation grid cell with one inside it
+HALO = 2 * SEPARATION_DISTANCES.max() + 1
+
+# Below this many enemies a frame is steered in this process, handing it out costs more than it saves
+MIN_PARALLEL_ENEMIES = 256
+
+
+def attach(name):
+    # Workers only borrow the blocks, the swarm that created them also unlinks them. Before Python 3.13
+    # attaching registers the block again with the resource tracker the workers share with this process,
+    # which is harmless, the unlink unregisters it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SwarmView:
+    def __init__(self, layout, separation_push):
+        # The arrays of a SharedSwarm as seen from a worker
+        self.separation_push = separation_push
+        self.blocks = []
+        self.names = [name for name, _, _, _ in layout]
+        for name, block_name, shape, dtype in layout:
+            block = attach(block_name)
+            self.blocks.append(block)
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+    def close(self):
+        for name in self.names:
+            delattr(self, name)
+        for block in self.blocks:
+            block.close()
+
+
+def steer_strip(view, count, first, last, player_pos, player_rect, player_alive, flow):
+    if first == last:
+        return 0
+
+    # The strip is a run of enemies sorted by x, its neighbours are everyone within the halo of it
+    order = view.order[:count]
+    xs = view.positions[order, 0]
+    neighbours_first = np.searchsorted(xs, xs[first] - HALO, side='left')
+    neighbours_last = np.searchsorted(xs, xs[last - 1] + HALO, side='right')
+    queries = np.sort(order[first:last])
+    neighbours = np.sort(order[neighbours_first:neighbours_last])
+    return steer(view, queries, neighbours, player_pos, player_rect, player_alive, view.next_positions, flow)
+
+
+def run_worker(connection, separation_push):
+    # Steers one strip of the swarm per job, until it is sent None
+    view = None
+    while True:
+        job = connection.recv()
+        if job is None:
+            break
+        layout, strip = job[0], job[1:]
+        if layout is not None:
+            if view is not None:
+                view.close()
+            view = SwarmView(layout, separation_push)
+        connection.send(steer_strip(view, *strip))
+
+    if view is not None:
+        view.close()
+
+
+class SharedSwarm(Swarm):
+    def __init__(self, frame_cache, separation_push, workers, capacity=256):
+        # The arrays live in shared memory, worker processes each steer a strip of the swarm
+        self.blocks = []
+        self.layout = []
+        self.layout_changed = True
+        super().__init__(frame_cache, separation_push, capacity)
+
+        context = multiprocessing.get_context()
+        self.connections = []
+        self.workers = []
+        for i in range(workers):
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(target=run_worker, args=(worker_connection, separation_push),
+                                     name='swarm-worker-{}'.format(i), daemon=True)
+            worker.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+    def new_array(self, shape, dtype):
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self.blocks.append(block)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.fill(0)
+        return array
+
+    def allocate(self, capacity):
+        old_blocks = self.blocks
+        self.blocks = []
+        super().allocate(capacity)
+
+        # Scratch arrays of the workers: x order of the enemies and where each one moves to
+        self.order = self.new_array((capacity,), np.int64)
+        self.next_positions = self.new_array((capacity, 2), np.float64)
+
+        names = [name for name, _, _ in COMPONENTS] + ['order', 'next_positions']
+        self.layout = [(name, block.name, getattr(self, name).shape, getattr(self, name).dtype.str)
+                       for name, block in zip(names, self.blocks)]
+        self.layout_changed = True
+
+        # The old blocks are still copied from when the swarm grows
+        self.retired = old_blocks
+
+    def grow(self):
+        super().grow()
+        self.release(self.retired)
+        self.retired = []
+
+    def release(self, blocks):
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    def steer(self, player_pos, player_rect, player_alive, flow):
+        count = self.count
+        if count < MIN_PARALLEL_ENEMIES:
+            return super().steer(player_pos, player_rect, player_alive, flow)
+
+        # Every enemy is in a strip only while there is a worker to take it
+        assert self.connections, 'a shared swarm needs at least one worker'
+
+        # Strips of the world with the same number of enemies in each, split on x
+        self.order[:count] = np.argsort(self.positions[:count, 0], kind='stable')
+        bounds = np.linspace(0, count, len(self.connections) + 1).astype(int).tolist()
+        layout = self.layout if self.layout_changed else None
+        self.layout_changed = False
+        for connection, first, last in zip(self.connections, bounds, bounds[1:]):
+            connection.send((layout, count, first, last, tuple(player_pos), player_rect, player_alive, flow))
+        damage = sum(connection.recv() for connection in self.connections)
+
+        self.positions[:count] = self.next_positions[:count]
+        return damage
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for worker in self.workers:
+            worker.join(1)
+        self.connections = []
+        self.workers = []
+
+        for name, _, _, _ in self.layout:
+            delattr(self, name)
+        self.release(self.blocks)
+        self.blocks = []
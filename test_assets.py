@@ -0,0 +1,39 @@
+import pygame
+import pytest
+
+from assets import ANIMATION_CLIPS, FrameCache, TextCache
+
+
+@pytest.fixture
+def font():
+    pygame.font.init()
+    yield pygame.font.Font(None, 24)
+    pygame.font.quit()
+
+
+def test_text_is_rendered_once(font):
+    cache = TextCache()
+    surface = cache.render(font, '00:01', (255, 0, 0))
+    for _ in range(100):
+        assert cache.render(font, '00:01', (255, 0, 0)) is surface
+    assert cache.render(font, '00:01', (0, 0, 0)) is not surface
+    assert cache.stats() == {'hits': 100, 'misses': 2, 'entries': 2}
+
+
+def test_least_recently_used_text_is_evicted(font):
+    cache = TextCache(max_entries=3)
+    first = cache.render(font, 'first', (0, 0, 0))
+    for second in range(60):
+        # The power-up lines are drawn every frame, so they stay while the timer strings come and go
+        assert cache.render(font, 'first', (0, 0, 0)) is first
+        cache.render(font, '00:{:02d}'.format(second), (0, 0, 0))
+    assert cache.stats() == {'hits': 60, 'misses': 61, 'entries': 3}
+
+
+def test_preloaded_clips_count_as_cold_loads():
+    cache = FrameCache(ANIMATION_CLIPS)
+    frames = (pygame.Surface((4, 4)),)
+    cache.store(('ripper', 'r'), frames)
+    cache.store(('ripper', 'r'), frames)
+    assert cache.get('ripper', 'r') is frames
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'clips': 1}
@@ -0,0 +1,59 @@
+from entities import EntityStore
+
+COMPONENTS = {'x': 'f', 'kind': 'b'}
+
+
+def test_destroyed_ids_are_reused():
+    store = EntityStore(COMPONENTS, 4)
+    first, second, third = store.create(x=1.5), store.create(x=2.5), store.create(x=3.5)
+    assert (first, second, third) == (0, 1, 2)
+
+    store.destroy(second)
+    assert len(store) == 2
+    assert list(store) == [first, third]
+    assert store.create(kind=2) == second
+    assert (store.x[second], store.kind[second]) == (0, 2)
+
+
+def test_grows_by_doubling_and_keeps_rows():
+    store = EntityStore(COMPONENTS, 2)
+    entities = [store.create(x=float(i), kind=i) for i in range(5)]
+    assert store.capacity == 8
+    assert entities == [0, 1, 2, 3, 4]
+    assert list(store.x[:5]) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert list(store.kind[:5]) == [0, 1, 2, 3, 4]
+
+
+def test_destroy_while_iterating():
+    store = EntityStore(COMPONENTS, 8)
+    for i in range(6):
+        store.create(kind=i)
+    visited = []
+    for entity in store:
+        visited.append(entity)
+        if entity % 2 == 0:
+            store.destroy(entity)
+    assert visited == [0, 1, 2, 3, 4, 5]
+    assert list(store) == [1, 3, 5]
+
+
+def test_clear_hands_out_lowest_ids_first():
+    store = EntityStore(COMPONENTS, 4)
+    for _ in range(4):
+        store.create()
+    store.destroy(2)
+    store.clear()
+    assert len(store) == 0
+    assert list(store) == []
+    assert [store.create() for _ in range(4)] == [0, 1, 2, 3]
+
+
+def test_destroying_twice_frees_the_id_once():
+    store = EntityStore(COMPONENTS, 4)
+    entity = store.create()
+    store.create()
+    store.destroy(entity)
+    store.destroy(entity)
+    assert len(store) == 1
+    assert store.create() != store.create()
+    assert len(store) == 3
@@ -0,0 +1,104 @@
+import random
+from collections import deque
+
+from flow import DIRECTIONS, STEPS, FlowField
+
+TILE_SIZE = 32
+
+
+class StubWorld:
+    # Random walls on an endless grid, the same cell is always the same
+    def __init__(self, seed, density):
+        self.tile_size = TILE_SIZE
+        self.seed = seed
+        self.density = density
+
+    def is_solid(self, col, row):
+        return random.Random(hash((self.seed, col, row))).random() < self.density
+
+    def solid_grid(self, first_col, first_row, cols, rows):
+        return bytearray(self.is_solid(first_col + col, first_row + row) for row in range(rows) for col in range(cols))
+
+
+def reference_layers(world, col, row, radius):
+    # Plain breadth-first search over the square around the target, diagonals may not cut a solid corner
+    layers = {(col, row): 0}
+    queue = deque([(col, row)])
+    while queue:
+        cell_col, cell_row = queue.popleft()
+        for dx, dy in STEPS:
+            neighbour = (cell_col + dx, cell_row + dy)
+            if neighbour in layers or max(abs(neighbour[0] - col), abs(neighbour[1] - row)) > radius:
+                continue
+            if world.is_solid(*neighbour):
+                continue
+            if dx and dy and (world.is_solid(cell_col + dx, cell_row) or world.is_solid(cell_col, cell_row + dy)):
+                continue
+            layers[neighbour] = layers[(cell_col, cell_row)] + 1
+            queue.append(neighbour)
+    return layers
+
+
+def field_direction(field, col, row):
+    return field.direction((col + 0.5) * TILE_SIZE, (row + 0.5) * TILE_SIZE)
+
+
+def check_field(field, world, col, row, radius):
+    layers = reference_layers(world, col, row, radius)
+    for cell_row in range(row - radius, row + radius + 1):
+        for cell_col in range(col - radius, col + radius + 1):
+            direction = field_direction(field, cell_col, cell_row)
+            layer = layers.get((cell_col, cell_row))
+            if not layer:
+                # The target, solid cells and cells with no way to the target
+                assert direction is None
+                continue
+
+            # A reachable cell steps to a neighbour one layer closer, around solid corners
+            dx, dy = STEPS[DIRECTIONS.index(direction) - 1]
+            assert layers.get((cell_col + dx, cell_row + dy)) == layer - 1
+            if dx and dy:
+                assert not world.is_solid(cell_col + dx, cell_row)
+                assert not world.is_solid(cell_col, cell_row + dy)
+
+
+def test_field_matches_reference_search():
+    for seed in range(20):
+        world = StubWorld(seed, 0.3)
+        rng = random.Random(seed)
+        col, row = rng.randint(-50, 50), rng.randint(-50, 50)
+        while world.is_solid(col, row):
+            col += 1
+
+        field = FlowField(world, 12)
+        field.update(col, row)
+        assert field.target == (col, row)
+        check_field(field, world, col, row, 12)
+
+        # Outside the field there is no direction
+        assert field_direction(field, col + 13, row) is None
+        assert field_direction(field, col, row - 13) is None
+
+
+def test_old_field_stays_in_use_until_the_search_finishes():
+    world = StubWorld(7, 0.2)
+    col, row = 0, 0
+    while world.is_solid(col, row) or world.is_solid(col + 6, row):
+        col += 1
+
+    field = FlowField(world, 12, layers_per_update=2)
+    field.update(col, row)
+    old_snapshot = field.snapshot()
+
+    updates = 0
+    while True:
+        field.update(col + 6, row)
+        updates += 1
+        if field.target != (col, row):
+            break
+        assert field.snapshot() == old_snapshot
+
+    # The search took several updates, then the new field replaced the old one at once
+    assert updates > 1
+    assert field.target == (col + 6, row)
+    check_field(field, world, col + 6, row, 12)
@@ -0,0 +1,44 @@
+import csv
+import os
+import subprocess
+import sys
+
+import pytest
+
+from level import LEVEL_HEADER, TILE_IDS, load_level
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+LEVEL_CSV = os.path.join(ROOT, 'level_map', 'level_map.csv')
+LEVEL_BIN = os.path.join(ROOT, 'level_map', 'level_map.bin')
+
+
+def csv_tiles():
+    # Tile ids straight from the CSV, the first line included
+    with open(LEVEL_CSV, newline='') as file:
+        return [[TILE_IDS[tile_char] if tile_char else 0 for tile_char in row] for row in csv.reader(file) if row]
+
+
+def test_converted_level_matches_csv(tmp_path):
+    path = str(tmp_path / 'level_map.bin')
+    subprocess.run([sys.executable, os.path.join('tools', 'convert_level.py'), LEVEL_CSV, path], cwd=ROOT,
+                   capture_output=True, check=True)
+
+    rows = csv_tiles()
+    level_map = load_level(path)
+    assert (level_map.cols, level_map.rows) == (len(rows[0]), len(rows))
+    assert [list(row) for row in level_map] == rows
+
+
+def test_shipped_level_is_up_to_date():
+    assert [list(row) for row in load_level(LEVEL_BIN)] == csv_tiles()
+
+
+def test_load_rejects_bad_files(tmp_path):
+    with open(LEVEL_BIN, 'rb') as file:
+        data = file.read()
+    path = tmp_path / 'level_map.bin'
+
+    for bad in (data[:LEVEL_HEADER.size - 1], b'XXXX' + data[4:], data[:-1]):
+        path.write_bytes(bad)
+        with pytest.raises(ValueError):
+            load_level(str(path))
@@ -0,0 +1,71 @@
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from replay import MAX_SEED, REPLAY_HEADER, InputRecorder, InputReplay
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_record_and_replay_round_trip(tmp_path):
+    rng = random.Random(5)
+    positions = [(rng.randint(-32768, 32767), rng.randint(-32768, 32767)) for _ in range(1000)]
+    recorder = InputRecorder(MAX_SEED)
+    for mouse_pos in positions:
+        recorder.record(mouse_pos)
+    path = tmp_path / 'game.stir'
+    recorder.save(path)
+
+    assert path.stat().st_size == REPLAY_HEADER.size + 4 * len(positions)
+    replay = InputReplay.load(path)
+    assert replay.seed == MAX_SEED
+    assert len(replay) == len(positions)
+    assert [replay.get(tick) for tick in range(len(replay))] == positions
+
+
+def test_load_rejects_bad_files(tmp_path):
+    recorder = InputRecorder(7)
+    recorder.record((1, 2))
+    path = tmp_path / 'game.stir'
+    recorder.save(path)
+    data = path.read_bytes()
+
+    for bad in (data[:10], b'XXXX' + data[4:], data[:-1]):
+        path.write_bytes(bad)
+        with pytest.raises(ValueError):
+            InputReplay.load(path)
+
+
+def test_seeds_outside_the_header_are_rejected(tmp_path):
+    for seed in (-1, MAX_SEED + 1):
+        with pytest.raises(ValueError):
+            InputRecorder(seed)
+
+    # The command line turns them down before a game is played or a file is opened
+    path = tmp_path / 'game.stir'
+    result = subprocess.run([sys.executable, 'main.py', '--headless', '--frames', '30', '--seed', '-1',
+                             '--record', str(path)], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert '--seed' in result.stderr
+    assert not path.exists()
+
+
+def run_headless(*args):
+    # The report, without the timings that differ between any two runs
+    output = subprocess.run([sys.executable, 'main.py', '--headless'] + list(args), cwd=ROOT, capture_output=True,
+                            text=True, check=True).stdout
+    report = json.loads(output[output.index('{'):])
+    for key in ('replay', 'elapsed_s', 'mean_ms', 'p50_ms', 'p95_ms', 'max_ms'):
+        del report[key]
+    return report
+
+
+def test_replayed_game_matches_the_recorded_one(tmp_path):
+    path = str(tmp_path / 'game.stir')
+    recorded = run_headless('--seed', '11', '--frames', '600', '--record', path)
+    assert len(InputReplay.load(path)) == 600
+    assert run_headless('--replay', path) == recorded
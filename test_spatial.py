@@ -0,0 +1,70 @@
+import random
+
+import pygame
+
+from spatial import SpatialHash
+
+
+def random_rects(rng, count):
+    # Sizes from a ripper collider up to a rhino collider
+    return [pygame.Rect(rng.randint(-500, 1500), rng.randint(-500, 1500), rng.randint(14, 165), rng.randint(14, 50))
+            for _ in range(count)]
+
+
+def test_query_finds_every_point_in_range():
+    rng = random.Random(1)
+    grid = SpatialHash(64)
+    points = [(rng.uniform(-500, 1500), rng.uniform(-500, 1500)) for _ in range(500)]
+    for item, (x, y) in enumerate(points):
+        grid.insert(item, x, y)
+
+    for _ in range(5000):
+        x, y, radius = rng.uniform(-600, 1600), rng.uniform(-600, 1600), rng.uniform(0, 200)
+        found = grid.query(x, y, radius)
+        assert len(found) == len(set(found))
+        in_range = {item for item, (item_x, item_y) in enumerate(points)
+                    if abs(item_x - x) <= radius and abs(item_y - y) <= radius}
+        assert in_range <= set(found)
+
+
+def test_query_rect_matches_full_scan():
+    rng = random.Random(2)
+    grid = SpatialHash(64)
+    rects = random_rects(rng, 500)
+    for item, rect in enumerate(rects):
+        grid.insert_rect(item, rect)
+
+    for probe in random_rects(rng, 5000):
+        found = grid.query_rect(probe)
+        assert len(found) == len(set(found))
+        hits = {item for item in found if rects[item].colliderect(probe)}
+        assert hits == {item for item, rect in enumerate(rects) if rect.colliderect(probe)}
+
+
+def test_nearest_matches_sorted_full_scan():
+    rng = random.Random(3)
+    grid = SpatialHash(64)
+    points = [(rng.uniform(-500, 1500), rng.uniform(-500, 1500)) for _ in range(500)]
+    for item, (x, y) in enumerate(points):
+        grid.insert(item, x, y)
+
+    def distance_squared(item, x, y):
+        return (points[item][0] - x) ** 2 + (points[item][1] - y) ** 2
+
+    for _ in range(2000):
+        x, y = rng.uniform(-700, 1700), rng.uniform(-700, 1700)
+        count = rng.randint(1, 5)
+        radius = rng.choice([None, rng.uniform(10, 400)])
+        accept = rng.choice([None, lambda item: item % 3 != 0])
+
+        candidates = [item for item in range(len(points)) if accept is None or accept(item)]
+        if radius is not None:
+            candidates = [item for item in candidates if distance_squared(item, x, y) <= radius * radius]
+        expected = sorted(candidates, key=lambda item: distance_squared(item, x, y))[:count]
+
+        found = grid.nearest(x, y, lambda item: points[item], count, radius, accept)
+        assert found == expected
+
+
+def test_nearest_of_an_empty_grid():
+    assert SpatialHash(64).nearest(0, 0, lambda item: item) == []
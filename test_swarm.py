@@ -0,0 +1,74 @@
+import random
+
+import pygame
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from swarm import ENEMY_TYPES, Swarm
+from swarm_pool import MIN_PARALLEL_ENEMIES, SharedSwarm
+
+
+def test_nearest_matches_sorted_full_scan():
+    rng = random.Random(4)
+    swarm = Swarm(None, 1.0)
+    swarm.count = 200
+    swarm.positions[:swarm.count] = [(rng.uniform(-500, 1500), rng.uniform(-500, 1500)) for _ in range(swarm.count)]
+    positions = swarm.positions[:swarm.count].tolist()
+
+    def distance_squared(index, origin):
+        return (positions[index][0] - origin[0]) ** 2 + (positions[index][1] - origin[1]) ** 2
+
+    for _ in range(2000):
+        origin = (rng.uniform(-700, 1700), rng.uniform(-700, 1700))
+        count = rng.randint(1, 5)
+        radius = rng.choice([None, rng.uniform(10, 400)])
+        view_rect = rng.choice([None, pygame.Rect(origin[0] - 400, origin[1] - 300, 800, 600)])
+
+        candidates = range(swarm.count)
+        if view_rect is not None:
+            candidates = [index for index in candidates
+                          if view_rect.left <= positions[index][0] <= view_rect.right and
+                          view_rect.top <= positions[index][1] <= view_rect.bottom]
+        if radius is not None:
+            candidates = [index for index in candidates if distance_squared(index, origin) <= radius * radius]
+        expected = sorted(candidates, key=lambda index: distance_squared(index, origin))[:count]
+
+        assert swarm.nearest(origin, count, radius, view_rect).tolist() == expected
+
+
+def play(swarm, frames=40):
+    # The same horde, player and flow field for every backend, with enemies hit, killed and spawned
+    # between frames so the arrays grow and compact while the workers hold them
+    rng = random.Random(5)
+
+    def spawn(count):
+        for _ in range(count):
+            swarm.spawn(rng.uniform(0, 2000), rng.uniform(0, 2000), rng.choice(ENEMY_TYPES), 1.25, 10, 5)
+
+    spawn(MIN_PARALLEL_ENEMIES + 200)
+    player_rect = pygame.Rect(1000, 1000, 40, 60)
+    directions = bytes(rng.randrange(9) for _ in range(41 * 41))
+    flow = (15, 15, 41, 25, directions)
+    damage = 0
+    for frame in range(frames):
+        damage += swarm.update((1000.0, 1000.0), player_rect, True, flow)
+        if frame % 10 == 0:
+            swarm.take_damage(np.arange(0, len(swarm), 7), 5)
+            spawn(100)
+    return damage
+
+
+def test_workers_match_single_process():
+    single = Swarm(None, 0.625)
+    single_damage = play(single)
+
+    shared = SharedSwarm(None, 0.625, 2, capacity=64)
+    try:
+        shared_damage = play(shared)
+        assert shared.count == single.count > MIN_PARALLEL_ENEMIES
+        assert shared_damage == single_damage
+        for name in ('positions', 'health', 'cooldowns'):
+            assert np.array_equal(getattr(shared, name)[:shared.count], getattr(single, name)[:single.count])
+    finally:
+        shared.close()
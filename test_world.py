@@ -0,0 +1,88 @@
+import os
+import random
+import time
+
+import pygame
+
+from level import TILE_IDS, load_level
+from world import ChunkStore, LevelChunkSource, TerrainGenerator
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+LEVEL_BIN = os.path.join(ROOT, 'level_map', 'level_map.bin')
+SOLID_TILES = {TILE_IDS['B'], TILE_IDS['W']}
+TILE_SIZE = 64
+
+
+def level_store(level_map, max_chunks=64, generator=None):
+    bounds = None if generator is not None else (level_map.cols, level_map.rows)
+    return ChunkStore(LevelChunkSource(level_map, 16, generator), SOLID_TILES, TILE_SIZE, 16, max_chunks, bounds)
+
+
+def test_collides_matches_a_scan_of_the_level():
+    level_map = load_level(LEVEL_BIN)
+    store = level_store(level_map, max_chunks=8)
+
+    def scan(rect):
+        # Every cell the rect overlaps, cells past the edge of the level are open
+        for row in range(rect.top // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE + 1):
+            for col in range(rect.left // TILE_SIZE, (rect.right - 1) // TILE_SIZE + 1):
+                if 0 <= row < level_map.rows and 0 <= col < level_map.cols and level_map[row][col] in SOLID_TILES:
+                    return True
+        return False
+
+    rng = random.Random(6)
+    width, height = level_map.cols * TILE_SIZE, level_map.rows * TILE_SIZE
+    try:
+        for _ in range(5000):
+            rect = pygame.Rect(rng.randint(-300, width + 300), rng.randint(-300, height + 300),
+                               rng.randint(1, 200), rng.randint(1, 200))
+            assert store.collides(rect) == scan(rect)
+        assert store.evicted > 0
+    finally:
+        store.stop()
+
+
+def test_worker_gives_the_same_chunks():
+    level_map = load_level(LEVEL_BIN)
+    for generator in (None, TerrainGenerator(3)):
+        worker_store = level_store(level_map, generator=generator)
+        direct_store = level_store(level_map, generator=generator)
+        try:
+            # A view across the corner of the level, so an endless world generates terrain too
+            rect = pygame.Rect(-600, -400, 1280, 720)
+            worker_store.prefetch(rect)
+            keys = [key for key in worker_store.chunk_keys(rect, 1) if worker_store.in_bounds(*key)]
+            deadline = time.monotonic() + 10
+            while worker_store.pending and time.monotonic() < deadline:
+                time.sleep(0.01)
+                worker_store.collect()
+
+            assert not worker_store.pending
+            assert sorted(worker_store.chunks) == sorted(keys)
+            for key in keys:
+                assert worker_store.chunks[key] == direct_store.get_chunk(*key)
+        finally:
+            worker_store.stop()
+            direct_store.stop()
+
+
+def test_least_recently_used_chunks_are_evicted():
+    store = level_store(load_level(LEVEL_BIN), max_chunks=4)
+    try:
+        for chunk_col in range(4):
+            store.get_chunk(chunk_col, 0)
+        store.get_chunk(0, 0)
+        store.get_chunk(4, 0)
+        store.get_chunk(5, 0)
+
+        assert list(store.chunks) == [(3, 0), (0, 0), (4, 0), (5, 0)]
+        assert store.stats() == {'chunks': 4, 'generated': 6, 'evicted': 2}
+    finally:
+        store.stop()
+
+
+def test_stop_joins_the_worker():
+    store = level_store(load_level(LEVEL_BIN))
+    store.prefetch(pygame.Rect(0, 0, 1280, 720))
+    store.stop()
+    assert not store.worker.is_alive()
@@ -0,0 +1,30 @@
+"""Convert a CSV level of tile characters to the binary level format loaded by the game.
+
+Run from the repository root: python tools/convert_level.py level_map/level_map.csv level_map/level_map.bin
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from level import load_level, read_csv_level, write_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('csv_path')
+    parser.add_argument('level_path')
+    args = parser.parse_args()
+
+    level_map = read_csv_level(args.csv_path)
+    write_level(args.level_path, level_map)
+
+    # Read it back, so a bad file never gets shipped
+    if load_level(args.level_path).tiles != level_map.tiles:
+        sys.exit('{} does not read back the same'.format(args.level_path))
+    print('{}: {} x {} tiles'.format(args.level_path, level_map.cols, level_map.rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import queue
+import threading
+from collections import OrderedDict
+
+from level import TILE_IDS
+
+
+def hash_cell(seed, x, y):
+    # Integer hash of a lattice point to [0, 1), the same on every run and platform
+    h = (x * 374761393 + y * 668265263 + seed * 2246822519) & 0xFFFFFFFF
+    h = ((h ^ (h >> 13)) * 1274126177) & 0xFFFFFFFF
+    return (h ^ (h >> 16)) / 0x100000000
+
+
+class TerrainGenerator:
+    def __init__(self, seed, scale=8):
+        # Value noise on a lattice every scale tiles: sand with clusters of stone rimmed by cave walls
+        self.seed = seed
+        self.scale = scale
+
+    def noise(self, col, row):
+        scale = self.scale
+        lattice_x, lattice_y = col // scale, row // scale
+        fraction_x = (col % scale) / scale
+        fraction_y = (row % scale) / scale
+        fraction_x = fraction_x * fraction_x * (3 - 2 * fraction_x)
+        fraction_y = fraction_y * fraction_y * (3 - 2 * fraction_y)
+
+        top = hash_cell(self.seed, lattice_x, lattice_y)
+        top += (hash_cell(self.seed, lattice_x + 1, lattice_y) - top) * fraction_x
+        bottom = hash_cell(self.seed, lattice_x, lattice_y + 1)
+        bottom += (hash_cell(self.seed, lattice_x + 1, lattice_y + 1) - bottom) * fraction_x
+        return top + (bottom - top) * fraction_y
+
+    def tile(self, col, row):
+        value = self.noise(col, row)
+        if value > 0.8:
+            return TILE_IDS['B']
+        if value > 0.76:
+            return TILE_IDS['W']
+        return TILE_IDS['G']
+
+
+class LevelChunkSource:
+    def __init__(self, level_map, chunk_tiles, generator=None):
+        # Chunks are cut from the level, cells outside it come from the generator or stay empty
+        self.level_map = level_map
+        self.chunk_tiles = chunk_tiles
+        self.generator = generator
+
+    def generate(self, chunk_col, chunk_row):
+        # Called from the worker thread as well as the main thread, so it only reads shared state
+        chunk_tiles = self.chunk_tiles
+        first_col = chunk_col * chunk_tiles
+        first_row = chunk_row * chunk_tiles
+        level_map = self.level_map
+
+        tiles = bytearray(chunk_tiles * chunk_tiles)
+        for row in range(first_row, first_row + chunk_tiles):
+            offset = (row - first_row) * chunk_tiles
+            inside_rows = 0 <= row < level_map.rows
+            row_tiles = level_map[row] if inside_rows else None
+            for col in range(first_col, first_col + chunk_tiles):
+                if inside_rows and 0 <= col < level_map.cols:
+                    tiles[offset + col - first_col] = row_tiles[col]
+                elif self.generator is not None:
+                    tiles[offset + col - first_col] = self.generator.tile(col, row)
+        return bytes(tiles)
+
+
+class ChunkStore:
+    def __init__(self, source, solid_tiles, tile_size, chunk_tiles=16, max_chunks=64, bounds=None):
+        # bounds is the (cols, rows) of a finite world, cells outside it are empty. None is endless
+        self.source = source
+        self.tile_size = tile_size
+        self.chunk_tiles = chunk_tiles
+        self.chunk_size = chunk_tiles * tile_size
+        self.max_chunks = max_chunks
+        self.bounds = bounds
+        self.solid_table = bytes(1 if tile_id in solid_tiles else 0 for tile_id in range(256))
+        self.empty_chunk = bytes(chunk_tiles * chunk_tiles)
+
+        # Tile ids of each chunk, least recently used first
+        self.chunks = OrderedDict()
+        self.generated = 0
+        self.evicted = 0
+
+        # Chunks are generated ahead of the camera in a worker, a chunk that is needed before
+        # the worker gets to it is generated on the spot, the source gives the same tiles either way
+        self.pending = set()
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = threading.Thread(target=self.generate_requests, name='chunk-generator', daemon=True)
+        self.worker.start()
+
+    def generate_requests(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                return
+            self.results.put((key, self.source.generate(*key)))
+
+    def stop(self):
+        # Ends the worker thread once it is done with the chunks already asked for
+        self.requests.put(None)
+        self.worker.join()
+
+    def in_bounds(self, chunk_col, chunk_row):
+        if self.bounds is None:
+            return True
+        cols, rows = self.bounds
+        return (0 <= chunk_col * self.chunk_tiles < cols) and (0 <= chunk_row * self.chunk_tiles < rows)
+
+    def store(self, key, tiles):
+        self.chunks[key] = tiles
+        self.generated += 1
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+            self.evicted += 1
+
+    def collect(self):
+        # Take in what the worker finished, main thread only
+        while True:
+            try:
+                key, tiles = self.results.get_nowait()
+            except queue.Empty:
+                return
+            self.pending.discard(key)
+            if key not in self.chunks:
+                self.store(key, tiles)
+
+    def chunk_keys(self, rect, margin=0):
+        first_col = rect.left // self.chunk_size - margin
+        last_col = (rect.right - 1) // self.chunk_size + margin
+        first_row = rect.top // self.chunk_size - margin
+        last_row = (rect.bottom - 1) // self.chunk_size + margin
+        for chunk_row in range(first_row, last_row + 1):
+            for chunk_col in range(first_col, last_col + 1):
+                yield chunk_col, chunk_row
+
+    def prefetch(self, rect, margin=1):
+        # Keeps the chunks around the rect recent and asks the worker for the missing ones
+        self.collect()
+        for key in self.chunk_keys(rect, margin):
+            if key in self.chunks:
+                self.chunks.move_to_end(key)
+            elif key not in self.pending and self.in_bounds(*key):
+                self.pending.add(key)
+                self.requests.put(key)
+
+    def get_chunk(self, chunk_col, chunk_row):
+        key = (chunk_col, chunk_row)
+        tiles = self.chunks.get(key)
+        if tiles is None:
+            if not self.in_bounds(chunk_col, chunk_row):
+                return self.empty_chunk
+            tiles = self.source.generate(chunk_col, chunk_row)
+            self.store(key, tiles)
+        else:
+            self.chunks.move_to_end(key)
+        return tiles
+
+    def tile(self, col, row):
+        chunk_tiles = self.chunk_tiles
+        tiles = self.get_chunk(col // chunk_tiles, row // chunk_tiles)
+        return tiles[(row % chunk_tiles) * chunk_tiles + col % chunk_tiles]
+
+    def is_solid(self, col, row):
+        if self.bounds is not None and not (0 <= col < self.bounds[0] and 0 <= row < self.bounds[1]):
+            return False
+        return self.solid_table[self.tile(col, row)] == 1
+
+    def solid_grid(self, first_col, first_row, cols, rows):
+        # Solid flags of a block of cells, row by row, read a chunk row at a time
+        chunk_tiles = self.chunk_tiles
+        grid = bytearray(cols * rows)
+        for row in range(rows):
+            chunk_row, tile_row = divmod(first_row + row, chunk_tiles)
+            start = row * cols
+            col = 0
+            while col < cols:
+                chunk_col, tile_col = divmod(first_col + col, chunk_tiles)
+                run = min(chunk_tiles - tile_col, cols - col)
+                offset = tile_row * chunk_tiles + tile_col
+                tiles = self.get_chunk(chunk_col, chunk_row)[offset:offset + run]
+                grid[start + col:start + col + run] = tiles.translate(self.solid_table)
+                col += run
+        return grid
+
+    def cell_range(self, rect):
+        # Columns and rows of every cell the rect overlaps, clipped to the world when it has bounds
+        if rect.width <= 0 or rect.height <= 0:
+            return range(0), range(0)
+        first_col = rect.left // self.tile_size
+        last_col = (rect.right - 1) // self.tile_size
+        first_row = rect.top // self.tile_size
+        last_row = (rect.bottom - 1) // self.tile_size
+        if self.bounds is not None:
+            first_col, last_col = max(first_col, 0), min(last_col, self.bounds[0] - 1)
+            first_row, last_row = max(first_row, 0), min(last_row, self.bounds[1] - 1)
+        return range(first_col, last_col + 1), range(first_row, last_row + 1)
+
+    def collides(self, rect):
+        cols, rows = self.cell_range(rect)
+        for row in rows:
+            for col in cols:
+                if self.is_solid(col, row):
+                    return True
+        return False
+
+    def stats(self):
+        return {'chunks': len(self.chunks), 'generated': self.generated, 'evicted': self.evicted}